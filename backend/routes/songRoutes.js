@@ -1,5 +1,11 @@
 const express = require('express');
 const router = express.Router();
+const { normalizeTitle } = require('../titles');
+
+// Escape regex metacharacters so user input is matched literally
+function escapeRegex(text) {
+    return text.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
+}
 
 // Route to get song data by title
 router.get('/song/:title', async (req, res) => {
@@ -26,4 +32,90 @@ router.get('/song/:title', async (req, res) => {
     }
 });
 
+// Upper bound on the unindexed title scan behind /tree
+const FALLBACK_TIMEOUT_MS = 2000;
+// MongoDB's error code for an operation that ran past its maxTimeMS
+const MAX_TIME_MS_EXPIRED = 50;
+
+// Song document for a title: an indexed lookup on the normalized keys, then, for
+// documents written before Song carried keys, the /song lookup with the title escaped
+async function findSong(songs, title) {
+    const song = await songs.findOne({ keys: normalizeTitle(title) });
+    if (song) {
+        return song;
+    }
+    try {
+        return await songs.findOne(
+            { original_song: { $regex: escapeRegex(title), $options: 'i' } },
+            { maxTimeMS: FALLBACK_TIMEOUT_MS }
+        );
+    } catch (error) {
+        if (error.code === MAX_TIME_MS_EXPIRED) {
+            return null;
+        }
+        throw error;
+    }
+}
+
+// Route to get a precomputed multi-level sample tree by title
+router.get('/tree/:title', async (req, res) => {
+    const title = req.params.title;
+
+    try {
+        const db = req.app.locals.dbClient.db('whosampled_db');
+
+        // Indexed point lookup on the trees materialized by scraper/sample_graph.py
+        const tree = await db.collection('tree_cache').findOne(
+            { keys: normalizeTitle(title) },
+            { sort: { weight: -1 } }
+        );
+        if (tree) {
+            return res.json(tree);
+        }
+
+        // Songs that have not been precomputed yet fall back to their single-level document
+        const song = await findSong(db.collection('Song'), title);
+        if (song) {
+            return res.json(song);
+        }
+        return res.status(404).json({ error: "Song not found" });
+    } catch (error) {
+        console.error('Error fetching sample tree:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
+// Must match PREFIX_LENGTH in scraper/sample_graph.py
+const PREFIX_LENGTH = 10;
+
+// Route to autocomplete titles, best connected first.
+// tree_cache documents carry their key prefixes up to PREFIX_LENGTH characters, so the
+// (prefixes, weight) index answers in weight order without scanning; longer queries
+// walk the same index entries and also filter on the full keys.
+router.get('/search/:query', async (req, res) => {
+    const key = normalizeTitle(req.params.query);
+    if (!key) {
+        return res.json([]);
+    }
+
+    const chars = Array.from(key);
+    const filter = { prefixes: chars.slice(0, PREFIX_LENGTH).join('') };
+    if (chars.length > PREFIX_LENGTH) {
+        filter.keys = { $gte: key, $lt: key + '\u{10ffff}' };
+    }
+
+    try {
+        const db = req.app.locals.dbClient.db('whosampled_db');
+        const matches = await db.collection('tree_cache')
+            .find(filter, { projection: { original_song: 1, weight: 1 } })
+            .sort({ weight: -1 })
+            .limit(10)
+            .toArray();
+        return res.json(matches.map(match => match.original_song));
+    } catch (error) {
+        console.error('Error searching songs:', error);
+        res.status(500).json({ error: 'Internal server error' });
+    }
+});
+
 module.exports = router;
@@ -0,0 +1,57 @@
+const assert = require('node:assert');
+const { test } = require('node:test');
+
+const router = require('../routes/songRoutes');
+
+// In-memory stand-in for a MongoDB collection, enough for findOne on the filters the routes use
+function collection(docs) {
+    return {
+        async findOne(filter) {
+            const matches = docs.filter(doc => Object.entries(filter).every(([field, condition]) => {
+                if (condition && condition.$regex !== undefined) {
+                    return new RegExp(condition.$regex, condition.$options).test(doc[field]);
+                }
+                return Array.isArray(doc[field]) ? doc[field].includes(condition) : doc[field] === condition;
+            }));
+            return matches[0] || null;
+        },
+    };
+}
+
+// Call a GET route's handler directly and return its status and JSON body
+async function get(path, params, collections) {
+    const layer = router.stack.find(layer => layer.route && layer.route.path === path);
+    const dbClient = { db: () => ({ collection: name => collection(collections[name] || []) }) };
+    const res = {
+        statusCode: 200,
+        status(code) { this.statusCode = code; return this; },
+        json(body) { this.body = body; return this; },
+    };
+    await layer.route.stack[0].handle({ params, app: { locals: { dbClient } } }, res);
+    return res;
+}
+
+const amen = { original_song: 'The Winstons - Amen, Brother', keys: ['amen brother', 'the winstons amen brother'] };
+
+test('/tree serves the cached tree', async () => {
+    const tree = { ...amen, sampled_by: [] };
+    const res = await get('/tree/:title', { title: 'Amen, Brother' }, { tree_cache: [tree], Song: [amen] });
+    assert.strictEqual(res.body, tree);
+});
+
+test('/tree falls back to the song by its bare title', async () => {
+    const res = await get('/tree/:title', { title: 'Amen, Brother' }, { Song: [amen] });
+    assert.strictEqual(res.statusCode, 200);
+    assert.strictEqual(res.body, amen);
+});
+
+test('/tree falls back to a title match for songs written without keys', async () => {
+    const song = { original_song: 'Lyn Collins - Think (About It)' };
+    const res = await get('/tree/:title', { title: 'think (about' }, { Song: [song] });
+    assert.strictEqual(res.body, song);
+});
+
+test('/tree treats the title literally', async () => {
+    const res = await get('/tree/:title', { title: '.*' }, { Song: [amen] });
+    assert.strictEqual(res.statusCode, 404);
+});
@@ -0,0 +1,13 @@
+const assert = require('node:assert');
+const { test } = require('node:test');
+
+const { normalizeTitle } = require('../titles');
+
+// Shared with scraper/tests/test_titles.py, so both normalizations stay in step
+const cases = require('../../scraper/fixtures/normalized_titles.json');
+
+test('normalizeTitle matches scraper/titles.py', () => {
+    for (const [title, key] of cases) {
+        assert.strictEqual(normalizeTitle(title), key, title);
+    }
+});
@@ -0,0 +1,18 @@
+// Same patterns as scraper/titles.py: featured artists and remaster suffixes
+const FEATURE_RE = /[(\[]?\b(?:feat|ft|featuring)\b\.?(?:(?! - )[^)\]])*[)\]]?/g;
+const REMASTER_RE = /[(\[][^)\]]*\bremaster(?:ed)?\b[^)\]]*[)\]]| - (?:\d{4} )?(?:digital )?remaster(?:ed)?\b.*$/g;
+
+// Normalize a title the same way scraper/titles.py does for tree_cache keys.
+// toLowerCase() stands in for Python's casefold(), which also folds ß and final ς.
+function normalizeTitle(title) {
+    const text = title.normalize('NFKD').replace(/\p{M}/gu, '').toLowerCase()
+        .replace(/ß/g, 'ss')
+        .replace(/ς/g, 'σ')
+        .replace(REMASTER_RE, ' ')
+        .replace(FEATURE_RE, ' ')
+        .replace(/&/g, ' and ')
+        .replace(/['’`]/g, '');
+    return text.split(/[^\p{L}\p{N}]+/u).filter(Boolean).join(' ');
+}
+
+module.exports = { normalizeTitle };
@@ -13,7 +13,7 @@ function App() {
       setLoading(true);
       setError(null);
       
-      const response = await fetch(`/api/song/${encodeURIComponent(title)}`);
+      const response = await fetch(`/api/tree/${encodeURIComponent(title)}`);
       const contentType = response.headers.get("content-type");
       
       if (!contentType?.includes("application/json")) {
@@ -58,6 +58,14 @@ function TreeDiagram({ data }) {
 
 // Helper function to transform MongoDB data to a hierarchy
 function dataStructure(data) {
+  // Precomputed tree_cache documents are already nested {name, children}
+  if (data.sampled_by.length && data.sampled_by[0].name !== undefined) {
+    return {
+      name: data.original_song,
+      children: data.sampled_by
+    };
+  }
+
   const children = data.sampled_by.map(sample => ({
     name: sample.track_name,
     children: sample.artists.map(artist => ({ name: artist }))
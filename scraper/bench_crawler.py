@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import glob
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crawler import Crawler
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+# Load the saved HTML pages that the stand-in server replays
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.html"))):
+        with open(path, "rb") as f:
+            pages.append(f.read())
+    if not pages:
+        raise SystemExit(f"No HTML fixtures found in {fixtures_dir}")
+    return pages
+
+
+# Local keep-alive HTTP server that answers /song/<n>/ with fixture n % len(pages)
+def start_server(pages, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            try:
+                n = int(self.path.strip("/").split("/")[-1])
+            except ValueError:
+                n = 0
+            body = pages[n % len(pages)]
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(base_url, pages, concurrency, parse_workers):
+    urls = [f"{base_url}/song/{n}/" for n in range(pages)]
+    ok = 0
+    async with Crawler(concurrency=concurrency, per_host=concurrency, rate=None,
+                       retries=0, render=False, parse_workers=parse_workers) as crawler:
+        # Timed after the parse pool has started
+        started = time.perf_counter()
+        async for result in crawler.crawl(urls):
+            ok += result.ok
+        return ok, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay HTML fixtures through the crawler and report pages/sec.")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="simulated server latency per page, in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="parser processes (default: one per core, 0 parses inline)")
+    args = parser.parse_args()
+
+    server = start_server(load_fixtures(), args.latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        for concurrency in args.concurrency:
+            ok, elapsed = asyncio.run(run(base_url, args.pages, concurrency, args.parse_workers))
+            print(f"concurrency={concurrency:<4} {ok}/{args.pages} pages in {elapsed:6.2f}s "
+                  f"-> {ok / elapsed:8.1f} pages/sec")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
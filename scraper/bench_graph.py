@@ -0,0 +1,65 @@
+import argparse
+import random
+import resource
+import time
+
+from sample_graph import SAMPLED_BY, SAMPLES, SampleGraph
+
+
+# Synthetic sample graph: `nodes` songs, `edges` sample edges with a skewed
+# (a few classics sampled by many songs) source distribution, cycles included
+def synthetic_graph(nodes, edges, seed=0):
+    rng = random.Random(seed)
+    graph = SampleGraph()
+    for n in range(nodes):
+        graph.node(f"Artist {n % 997} - Song {n}")
+    graph.songs.extend(range(nodes))
+    for _ in range(edges):
+        sampled = min(nodes - 1, int(rng.paretovariate(1.2)) - 1 + rng.randrange(nodes) // 50)
+        graph.add_edge(sampled, rng.randrange(nodes))
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sample graph build and tree materialization.")
+    parser.add_argument("--nodes", type=int, default=200_000)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    parser.add_argument("--depth", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--max-nodes", type=int, default=500)
+    parser.add_argument("--trees", type=int, default=2000, help="roots sampled per depth")
+    parser.add_argument("--snapshot", help="benchmark a graph snapshot (see snapshot.py) instead of a synthetic graph")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        from snapshot import Snapshot
+
+        started = time.perf_counter()
+        graph = Snapshot(args.snapshot)
+        print(f"{graph.node_count} nodes, {graph.edge_count} unique edges: "
+              f"snapshot mapped in {(time.perf_counter() - started) * 1000:.1f} ms")
+        node_count = graph.node_count
+    else:
+        started = time.perf_counter()
+        graph = synthetic_graph(args.nodes, args.edges)
+        generated = time.perf_counter()
+        graph.freeze()
+        frozen = time.perf_counter()
+        print(f"{args.nodes} nodes, {graph.edge_count} unique edges: generated in {generated - started:.2f}s, "
+              f"CSR built in {frozen - generated:.2f}s, edge arrays {graph.nbytes() / 2**20:.1f} MiB, "
+              f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+        node_count = args.nodes
+
+    roots = random.Random(1).sample(range(node_count), min(args.trees, node_count))
+    for depth in args.depth:
+        started = time.perf_counter()
+        total = 0
+        for root in roots:
+            for direction in (SAMPLED_BY, SAMPLES):
+                total += graph.tree(root, direction, depth, args.max_nodes)[1]
+        elapsed = time.perf_counter() - started
+        print(f"depth={depth}: {len(roots) / elapsed:8.0f} trees/sec (both directions), "
+              f"avg {total / len(roots):6.1f} nodes per tree pair")
+
+
+if __name__ == "__main__":
+    main()
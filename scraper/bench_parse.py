@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import os
+import time
+
+from bench_crawler import load_fixtures
+from parse_pool import ParsePool
+from song_parser import parse_song_data
+
+
+# The BeautifulSoup extraction from scraper.py, with a configurable tree builder
+def parse_with_bs4(html_content, features):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, features)
+    data = {"samples": [], "sampled_by": []}
+
+    def extract_songs(section_header_text):
+        songs = []
+        section_header = soup.find("h3", class_="section-header-title",
+                                   string=lambda text: text and section_header_text in text.lower())
+        parent_section = section_header.find_parent("section") if section_header else None
+        table = parent_section.find("table", class_="table tdata") if parent_section else None
+        tbody = table.find("tbody") if table else None
+        for row in tbody.find_all("tr") if tbody else []:
+            track_td = row.find("td", class_="tdata__td2")
+            meta = row.find_all("td", class_="tdata__td3")
+            songs.append({
+                "track_name": track_td.find("a", class_="trackName playIcon").text.strip() if track_td else "Unknown Track",
+                "artists": [a.text.strip() for a in meta[0].find_all("a")] if meta else ["Unknown Artist"],
+                "release_year": meta[1].text.strip() if len(meta) > 1 else "Unknown Year",
+                "additional_info": meta[2].text.strip() if len(meta) > 2 else "",
+            })
+        return songs
+
+    data["samples"] = extract_songs("contains samples of")
+    data["sampled_by"] = extract_songs("sampled in")
+    return data
+
+
+PARSERS = {
+    "bs4+html5lib": lambda html: parse_with_bs4(html, "html5lib"),
+    "bs4+lxml": lambda html: parse_with_bs4(html, "lxml"),
+    "lxml": parse_song_data,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare song page parsers on the HTML fixtures.")
+    parser.add_argument("--pages", type=int, default=200, help="pages parsed per parser")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="ParsePool worker processes")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    pages = [fixtures[n % len(fixtures)] for n in range(args.pages)]
+    size = sum(len(page) for page in pages)
+
+    for name, parse in PARSERS.items():
+        started = time.perf_counter()
+        for page in pages:
+            parse(page)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<14} {len(pages) / elapsed:8.1f} pages/sec  {size / elapsed / 2**20:7.1f} MiB/sec")
+
+    # lxml on every core through the crawler's own ParsePool: one page per task,
+    # paying its pickling and IPC, with every page submitted at once
+    async def pooled():
+        with ParsePool(args.workers) as pool:
+            await asyncio.gather(*(pool.parse(page) for page in pages[:pool.workers]))  # warm up the workers
+            started = time.perf_counter()
+            await asyncio.gather(*(pool.parse(page) for page in pages))
+            return time.perf_counter() - started
+
+    elapsed = asyncio.run(pooled())
+    print(f"{'ParsePool x' + str(args.workers):<14} {len(pages) / elapsed:8.1f} pages/sec  "
+          f"{size / elapsed / 2**20:7.1f} MiB/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import asyncio
+import os
+import sys
+
+from playwright.async_api import async_playwright
+
+from crawler import USER_AGENT
+
+try:
+    from playwright._impl._errors import TargetClosedError
+except ImportError:  # not exposed by older playwright releases
+    TargetClosedError = ()
+
+# Resource types that song pages render fine without
+BLOCKED_RESOURCES = {"image", "font", "media"}
+# Playwright's own timeouts sit this far above page_timeout, so ours fires first
+PLAYWRIGHT_TIMEOUT_MARGIN = 5.0
+
+
+# Resident set size of a process, in bytes (Linux only; None elsewhere)
+def _rss(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# One long-lived chromium with its browsing context
+class _Slot:
+    def __init__(self, browser, context):
+        self.browser = browser
+        self.context = context
+        self.pages = 0
+        self.stale = False
+
+
+# Pool of `size` long-lived headless chromium instances for JS-rendered pages.
+#
+# Each browser renders one page at a time in a reused context that aborts
+# image, font and media requests. A browser (and its context) is replaced
+# after `pages_per_browser` pages, once it has crashed or disconnected, or once
+# its process tree uses more than `max_rss_mb` (checked over CDP every
+# `rss_check_every` pages; if chromium can't report it, RSS checks are turned
+# off rather than relaunching on every page). Page-level failures (timeouts,
+# net::ERR_* navigation errors) keep the browser. Every render is bounded by
+# `page_timeout`.
+class BrowserPool:
+    def __init__(self, size=2, pages_per_browser=100, max_rss_mb=1024, rss_check_every=10,
+                 page_timeout=30.0, headless=True, blocked=BLOCKED_RESOURCES):
+        self.size = size
+        self.pages_per_browser = pages_per_browser
+        self.max_rss = max_rss_mb * 2**20 if max_rss_mb else None
+        self.rss_check_every = rss_check_every
+        self.page_timeout = page_timeout
+        self.headless = headless
+        self.blocked = set(blocked)
+        self.playwright = None
+        self.slots = None
+        self.recycled = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        self.playwright = await async_playwright().start()
+        launches = await asyncio.gather(*(self._launch() for _ in range(self.size)), return_exceptions=True)
+        failures = [result for result in launches if isinstance(result, BaseException)]
+        if failures:
+            # Don't leave half a pool (or the playwright driver) running
+            for slot in launches:
+                if isinstance(slot, _Slot):
+                    await self._shutdown(slot)
+            await self.playwright.stop()
+            self.playwright = None
+            raise failures[0]
+        self.slots = asyncio.Queue()
+        for slot in launches:
+            self.slots.put_nowait(slot)
+
+    async def close(self):
+        if self.slots is not None:
+            for _ in range(self.size):
+                slot = await self.slots.get()
+                await self._shutdown(slot)
+            self.slots = None
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+
+    async def _launch(self):
+        browser = await self.playwright.chromium.launch(headless=self.headless)
+        context = await browser.new_context(user_agent=USER_AGENT, locale="en-US",
+                                            viewport={"width": 1280, "height": 900})
+        context.set_default_timeout((self.page_timeout + PLAYWRIGHT_TIMEOUT_MARGIN) * 1000)
+        await context.route("**/*", self._filter)
+        return _Slot(browser, context)
+
+    async def _filter(self, route):
+        if route.request.resource_type in self.blocked:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    # Close the context and the browser independently, so a failing context
+    # close can't leave the chromium process running
+    async def _shutdown(self, slot):
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+        try:
+            await slot.browser.close()
+        except Exception:
+            pass
+
+    # Total RSS of the browser's processes, from the pids chromium reports over CDP
+    async def _browser_rss(self, slot):
+        session = await slot.browser.new_browser_cdp_session()
+        try:
+            info = await session.send("SystemInfo.getProcessInfo")
+        finally:
+            await session.detach()
+        sizes = [_rss(process["id"]) for process in info["processInfo"]]
+        return sum(size for size in sizes if size) if any(sizes) else None
+
+    async def _needs_recycle(self, slot):
+        if slot.stale or slot.pages >= self.pages_per_browser:
+            return True
+        if self.max_rss and slot.pages and slot.pages % self.rss_check_every == 0:
+            try:
+                rss = await self._browser_rss(slot)
+            except Exception as e:
+                if not slot.browser.is_connected():
+                    return True
+                print(f"Browser RSS check failed ({e!r}); no longer checking RSS.", file=sys.stderr)
+                self.max_rss = None
+                return False
+            return rss is not None and rss > self.max_rss
+        return False
+
+    async def _render(self, slot, url, wait_for):
+        page = await slot.context.new_page()
+        try:
+            await page.goto(url, wait_until="domcontentloaded")
+            if wait_for:
+                await page.wait_for_selector(wait_for)
+            return await page.content()
+        finally:
+            await page.close()
+
+    # Render `url` and return its HTML once `wait_for` matches
+    async def render(self, url, wait_for="div.divided-layout"):
+        slot = await self.slots.get()
+        try:
+            if await self._needs_recycle(slot):
+                # Stays stale if the relaunch fails, so the next caller retries it
+                slot.stale = True
+                await self._shutdown(slot)
+                slot = await self._launch()
+                self.recycled += 1
+            slot.pages += 1
+            try:
+                return await asyncio.wait_for(self._render(slot, url, wait_for), self.page_timeout)
+            except Exception as e:
+                # A slow or broken page says nothing about the browser; only a dead one is replaced
+                if isinstance(e, TargetClosedError) or not slot.browser.is_connected():
+                    slot.stale = True
+                raise
+        finally:
+            self.slots.put_nowait(slot)
+
+    # Render many URLs with one worker per browser, yielding (url, html or exception)
+    async def render_all(self, urls, wait_for="div.divided-layout"):
+        pending = iter(urls)
+        results = asyncio.Queue()
+
+        async def worker():
+            for url in pending:
+                try:
+                    html = await self.render(url, wait_for)
+                except Exception as e:
+                    html = e
+                await results.put((url, html))
+            await results.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.size)]
+        try:
+            finished = 0
+            while finished < len(workers):
+                item = await results.get()
+                if item is None:
+                    finished += 1
+                else:
+                    yield item
+        finally:
+            for task in workers:
+                task.cancel()
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crawl_index.sqlite3")
+
+
+def content_hash(content):
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+# Hash of the parsed record, so pages whose markup changed but whose data did not skip the write
+def data_hash(data):
+    return content_hash(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+
+
+# Persistent URL -> (ETag, Last-Modified, content hash) index for incremental re-crawls.
+#
+# checked_at is when the page was last requested, changed_at when its parsed
+# data last changed. Writes are batched and committed every `commit_every`
+# updates or on close().
+class CrawlIndex:
+    def __init__(self, path=DEFAULT_PATH, commit_every=500):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                data_hash TEXT,
+                checked_at REAL,
+                changed_at REAL
+            )""")
+        self.commit_every = commit_every
+        self.uncommitted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def get(self, url):
+        row = self.conn.execute(
+            "SELECT etag, last_modified, content_hash, data_hash, checked_at, changed_at "
+            "FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("etag", "last_modified", "content_hash", "data_hash",
+                         "checked_at", "changed_at"), row))
+
+    def urls(self, checked_before=None):
+        if checked_before is None:
+            rows = self.conn.execute("SELECT url FROM pages")
+        else:
+            rows = self.conn.execute("SELECT url FROM pages WHERE checked_at < ?", (checked_before,))
+        return [url for (url,) in rows]
+
+    # Request headers that let the server answer 304 Not Modified
+    def conditional_headers(self, url):
+        entry = self.get(url)
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    # Mark a page as checked without changing its validators (304 or identical body)
+    def touch(self, url):
+        self.conn.execute("UPDATE pages SET checked_at = ? WHERE url = ?", (time.time(), url))
+        self._maybe_commit()
+
+    # Store fresh validators; changed_at only moves when the parsed data changed
+    def record(self, url, etag=None, last_modified=None, content_hash=None, data_hash=None):
+        now = time.time()
+        self.conn.execute("""
+            INSERT INTO pages (url, etag, last_modified, content_hash, data_hash, checked_at, changed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                content_hash = excluded.content_hash,
+                changed_at = CASE WHEN pages.data_hash IS excluded.data_hash
+                                  THEN pages.changed_at ELSE excluded.changed_at END,
+                data_hash = excluded.data_hash,
+                checked_at = excluded.checked_at
+            """, (url, etag, last_modified, content_hash, data_hash, now, now))
+        self._maybe_commit()
+
+    def _maybe_commit(self):
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.conn.commit()
+            self.uncommitted = 0
@@ -0,0 +1,294 @@
+import asyncio
+import os
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from crawl_index import content_hash
+from metrics import CACHE_HITS, PAGES, RESPONSES, RETRIES, STAGE_SECONDS, THROTTLES, request_tracer
+from song_parser import is_captcha_present, needs_javascript, parse_song_data
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+              "AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/115.0.0.0 Safari/537.36")
+
+# Responses worth retrying; anything else is returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+# Token bucket shared by all workers: `rate` requests/sec with bursts up to `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                THROTTLES.labels("rate_limit").inc()
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Result of crawling one URL
+class CrawlResult:
+    def __init__(self, url, status=None, data=None, rendered=False, error=None,
+                 unchanged=False, validators=None):
+        self.url = url
+        self.status = status
+        self.data = data
+        self.rendered = rendered
+        self.error = error
+        self.unchanged = unchanged
+        self.validators = validators or {}
+
+    @property
+    def ok(self):
+        return self.error is None and self.data is not None
+
+    def __repr__(self):
+        return f"CrawlResult({self.url!r}, status={self.status}, ok={self.ok})"
+
+
+# Concurrent song page crawler on one pooled keep-alive httpx client.
+#
+# `concurrency` caps pages in flight overall, `per_host` caps them per host,
+# and `rate` (requests/sec) is enforced across all workers. A server's
+# Retry-After is honoured up to `max_retry_after` seconds; a URL told to wait
+# longer is given up on rather than stalling its worker. Pages that come back
+# without their content are rendered in a shared BrowserPool of
+# `render_browsers` chromium instances when `render` is on.
+#
+# With a CrawlIndex, pages are revalidated with conditional GETs and are not
+# parsed when the server answers 304 or the body hash is unchanged; `full`
+# ignores the index and re-parses everything.
+#
+# Pages are parsed in a ParsePool of `parse_workers` processes (default: one
+# per core), off the event loop; 0 parses inline. When the parsers fall
+# behind, fetchers wait for them rather than fetching further ahead.
+class Crawler:
+    def __init__(self, concurrency=32, per_host=8, rate=10.0, burst=None,
+                 retries=3, backoff=0.5, max_retry_after=60.0, timeout=20.0, render=True,
+                 transport=None, index=None, full=False, render_browsers=2, parse_workers=None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+        self.render = render
+        self.render_browsers = render_browsers
+        self.browser_pool = None
+        self.browser_pool_lock = asyncio.Lock()
+        self.transport = transport
+        self.index = index
+        self.full = full
+        self.parse_workers = os.cpu_count() if parse_workers is None else parse_workers
+        self.parse_pool = None
+        self.client = None
+        self.host_limits = {}
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT, "Accept-Language": "en-US,en;q=0.9"},
+            limits=httpx.Limits(max_connections=self.concurrency,
+                                max_keepalive_connections=self.concurrency),
+            timeout=self.timeout,
+            follow_redirects=True,
+            transport=self.transport,
+        )
+        if self.parse_workers:
+            from parse_pool import ParsePool
+
+            self.parse_pool = ParsePool(self.parse_workers)
+            self.parse_pool.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        self.client = None
+        if self.parse_pool:
+            self.parse_pool.close()
+            self.parse_pool = None
+        if self.browser_pool:
+            await self.browser_pool.close()
+            self.browser_pool = None
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self.host_limits[host]
+
+    def _retry_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    # GET a URL, retrying transport errors and retryable statuses with backoff.
+    # Connect, TLS, TTFB and download times are recorded via httpx's trace hook.
+    async def fetch(self, url, headers=None):
+        attempt = 0
+        while True:
+            if self.bucket:
+                await self.bucket.acquire()
+            response = None
+            try:
+                async with self._host_limit(url):
+                    response = await self.client.get(url, headers=headers,
+                                                     extensions={"trace": request_tracer()})
+                RESPONSES.labels(str(response.status_code)).inc()
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                if response.status_code == 429 or "Retry-After" in response.headers:
+                    THROTTLES.labels("server").inc()
+            except httpx.TransportError as e:
+                if attempt >= self.retries:
+                    raise
+                RETRIES.labels(type(e).__name__).inc()
+            if attempt >= self.retries:
+                return response
+            delay = self._retry_delay(attempt, response)
+            if response is not None:
+                if delay > self.max_retry_after:
+                    return response
+                RETRIES.labels(str(response.status_code)).inc()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    # Render a page in headless chromium, for pages that need JavaScript.
+    # The browser pool is only started the first time a page needs it.
+    async def render_page(self, url):
+        async with self.browser_pool_lock:
+            if self.browser_pool is None:
+                from browser_pool import BrowserPool
+
+                pool = BrowserPool(size=self.render_browsers, page_timeout=self.timeout)
+                await pool.start()
+                self.browser_pool = pool
+        return await self.browser_pool.render(url)
+
+    # Fetch and parse a single song page
+    async def crawl_one(self, url):
+        result = await self._crawl_one(url)
+        if result.unchanged:
+            PAGES.labels("unchanged").inc()
+        else:
+            PAGES.labels("ok" if result.ok else "failed").inc()
+        return result
+
+    async def _crawl_one(self, url):
+        try:
+            entry = self.index.get(url) if self.index and not self.full else None
+            headers = self.index.conditional_headers(url) if entry else None
+            response = await self.fetch(url, headers)
+            if response.status_code == 304 and entry:
+                CACHE_HITS.labels("not_modified").inc()
+                return CrawlResult(url, 304, unchanged=True)
+            if response.status_code != 200:
+                return CrawlResult(url, response.status_code, error=f"HTTP {response.status_code}")
+
+            content, rendered = response.content, False
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_hash": content_hash(content),
+            }
+            if entry and entry["content_hash"] == validators["content_hash"]:
+                CACHE_HITS.labels("same_hash").inc()
+                return CrawlResult(url, 200, unchanged=True, validators=validators)
+            if is_captcha_present(content):
+                return CrawlResult(url, response.status_code, error="captcha")
+            if needs_javascript(content):
+                if not self.render:
+                    return CrawlResult(url, response.status_code, error="needs javascript")
+                with STAGE_SECONDS.labels("render").time():
+                    content, rendered = await self.render_page(url), True
+
+            # Pooled parse times include waiting for a free worker
+            with STAGE_SECONDS.labels("parse").time():
+                if self.parse_pool:
+                    data = await self.parse_pool.parse(content, url)
+                else:
+                    data = parse_song_data(content, url)
+            return CrawlResult(url, response.status_code, data, rendered, validators=validators)
+        except Exception as e:
+            return CrawlResult(url, error=f"{type(e).__name__}: {e}")
+
+    # Crawl URLs with `concurrency` workers, yielding results as they complete.
+    # At most `concurrency` results wait to be consumed; beyond that the
+    # workers stop fetching until the caller catches up.
+    async def crawl(self, urls):
+        queue = asyncio.Queue()
+        for url in urls:
+            queue.put_nowait(url)
+        total = queue.qsize()
+        results = asyncio.Queue(maxsize=self.concurrency)
+
+        async def worker():
+            while True:
+                try:
+                    url = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await results.put(await self.crawl_one(url))
+
+        workers = [asyncio.create_task(worker())
+                   for _ in range(min(self.concurrency, total))]
+        try:
+            for _ in range(total):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+
+
+async def main(urls):
+    from db import init_mongo, song_collection
+    from mongo_sink import SongSink, ensure_indexes
+
+    client = init_mongo()
+    collection = song_collection(client)
+    ensure_indexes(collection)
+    started = time.perf_counter()
+    ok = 0
+    try:
+        with SongSink(collection) as sink:
+            async with Crawler() as crawler:
+                async for result in crawler.crawl(urls):
+                    if result.ok:
+                        ok += 1
+                        await sink.add_async(result.data)
+                        print(f"{result.url}: {len(result.data['sampled_by'])} sampled_by, "
+                              f"{len(result.data['samples'])} samples")
+                    else:
+                        print(f"{result.url}: failed ({result.error})")
+        elapsed = time.perf_counter() - started
+        print(f"Crawled {ok}/{len(urls)} pages in {elapsed:.2f}s.")
+        print(sink.report())
+    finally:
+        client.close()
+
+
+# Example usage: python crawler.py urls.txt  (or URLs as arguments)
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and not sys.argv[1].startswith("http"):
+        with open(sys.argv[1], encoding="utf-8") as f:
+            urls = [line.strip() for line in f if line.strip()]
+    else:
+        urls = sys.argv[1:]
+    asyncio.run(main(urls))
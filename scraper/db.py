@@ -0,0 +1,45 @@
+import os
+import sys
+
+import certifi
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure
+
+# Load environment variables from the backend's .env file
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", ".env"))
+
+# MongoDB Configuration
+MONGO_URI = os.getenv('MONGO_URI')
+DB_NAME = os.getenv('DB_NAME', 'whosampled_db')  # Default to 'whosampled_db' if not set
+
+
+# Initialize MongoDB Client
+def init_mongo(uri=None):
+    uri = uri or MONGO_URI
+    if not uri:
+        print("Error: MONGO_URI not found in environment variables.")
+        sys.exit(1)
+    try:
+        # Atlas (mongodb+srv) needs TLS; a local mongod usually does not
+        tls_options = {"tls": True, "tlsCAFile": certifi.where()} if uri.startswith("mongodb+srv://") else {}
+        client = MongoClient(
+            uri,
+            serverSelectionTimeoutMS=5000,
+            connectTimeoutMS=20000,
+            socketTimeoutMS=20000,
+            maxPoolSize=50,
+            retryWrites=True,
+            **tls_options
+        )
+        # Attempt to retrieve server info to trigger connection
+        client.server_info()
+        print("MongoDB connection established.")
+        return client
+    except ConnectionFailure as e:
+        print(f"Failed to connect to MongoDB: {e}")
+        sys.exit(1)
+
+
+def song_collection(client):
+    return client[DB_NAME]['Song']
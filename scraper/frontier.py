@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontier.sqlite3")
+
+QUEUED, IN_FLIGHT, DONE, FAILED = 0, 1, 2, 3
+STATE_NAMES = {QUEUED: "queued", IN_FLIGHT: "in flight", DONE: "done", FAILED: "failed"}
+
+
+# Canonical form used for deduplication: lower-case scheme and host, no default
+# port, fragment or tracking parameters, sorted query, trailing slash on the path
+def canonical_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "https"
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != {"http": 80, "https": 443}.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if not path.endswith("/") and "." not in path.rsplit("/", 1)[-1]:
+        path += "/"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not k.startswith("utm_")))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+# Signed 64-bit hash of a canonical URL (the table's integer primary key)
+def url_key(canonical):
+    return int.from_bytes(hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+# Persistent crawl frontier in a sqlite WAL database.
+#
+# Every URL is stored once under the hash of its canonical form, with its
+# state, priority, depth and shard (hash % shards). A Frontier instance works
+# one shard: claim() leases the highest-priority, shallowest queued URLs, and
+# done()/fail() settle them.
+#
+# Settlements and newly added URLs are buffered in memory and written at
+# checkpoints (every `checkpoint_every` changes or `checkpoint_interval`
+# seconds), each in one short BEGIN IMMEDIATE transaction, so shards sharing
+# the file only hold its write lock for milliseconds. A crash loses at most
+# the changes since the last checkpoint; the URLs involved are still in
+# flight and are queued again when the shard is reopened or their lease runs
+# out.
+#
+# One process per shard works it (and opens it with recover=True); any process
+# may add() URLs to any shard. The connection may be used from one thread at a
+# time, not necessarily the one that opened it.
+class Frontier:
+    def __init__(self, path=DEFAULT_PATH, shard=0, shards=None, recover=False, lease_seconds=600,
+                 checkpoint_every=200, checkpoint_interval=5.0, max_attempts=3):
+        # Autocommit: every transaction is an explicit, short BEGIN IMMEDIATE ... COMMIT
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value);
+            CREATE TABLE IF NOT EXISTS urls (
+                key INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                state INTEGER NOT NULL DEFAULT 0,
+                priority INTEGER NOT NULL DEFAULT 0,
+                depth INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                leased_until REAL,
+                error TEXT,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS urls_claim ON urls (shard, state, priority DESC, depth);
+        """)
+        self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('shards', ?)", (shards or 1,))
+        self.shards = self.conn.execute("SELECT value FROM meta WHERE name = 'shards'").fetchone()[0]
+        if shards and shards != self.shards:
+            raise ValueError(f"{path} is split into {self.shards} shards, not {shards}")
+        if not 0 <= shard < self.shards:
+            raise ValueError(f"shard {shard} out of range for {self.shards} shards")
+
+        self.shard = shard
+        self.lease_seconds = lease_seconds
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.max_attempts = max_attempts
+        # Buffered changes: key -> row to insert, key -> (state, error, updated_at)
+        self.discovered = {}
+        self.settled = {}
+        # Attempts of each claimed URL, including the current one
+        self.attempts = {}
+        self.last_checkpoint = time.monotonic()
+        # In-memory dedupe; the primary key catches URLs added by other processes
+        self.seen = {key for (key,) in self.conn.execute("SELECT key FROM urls")}
+        if recover:
+            self.recover()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.checkpoint()
+        self.conn.close()
+
+    # Queue everything this shard had in flight: its previous owner is gone
+    def recover(self):
+        self.conn.execute("UPDATE urls SET state = ?, leased_until = NULL WHERE shard = ? AND state = ?",
+                          (QUEUED, self.shard, IN_FLIGHT))
+
+    # Queue a URL unless its canonical form was seen before; returns whether it was new
+    def add(self, url, priority=0, depth=0):
+        canonical = canonical_url(url)
+        key = url_key(canonical)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.discovered[key] = (key, canonical, key % self.shards, priority, depth, time.time())
+        return True
+
+    # Lease up to `n` queued URLs (or in-flight ones whose lease expired) as (url, depth)
+    def claim(self, n):
+        now = time.time()
+        with self._transaction():
+            rows = self.conn.execute("""
+                SELECT key, url, depth, attempts FROM urls
+                WHERE shard = ? AND (state = ? OR (state = ? AND leased_until < ?))
+                ORDER BY state, priority DESC, depth
+                LIMIT ?""", (self.shard, QUEUED, IN_FLIGHT, now, n)).fetchall()
+            self.conn.executemany(
+                "UPDATE urls SET state = ?, leased_until = ?, attempts = attempts + 1 WHERE key = ?",
+                [(IN_FLIGHT, now + self.lease_seconds, key) for key, _, _, _ in rows])
+        for key, _, _, attempts in rows:
+            self.attempts[key] = attempts + 1
+        return [(url, depth) for _, url, depth, _ in rows]
+
+    def done(self, url):
+        self._settle(url, DONE, None)
+
+    # Requeue a failed URL until it has been tried `max_attempts` times
+    def fail(self, url, error=None):
+        key = url_key(canonical_url(url))
+        attempts = self.attempts.get(key)
+        if attempts is None:
+            row = self.conn.execute("SELECT attempts FROM urls WHERE key = ?", (key,)).fetchone()
+            attempts = row[0] if row else self.max_attempts
+        self._settle(url, QUEUED if attempts < self.max_attempts else FAILED, error)
+
+    def _settle(self, url, state, error):
+        key = url_key(canonical_url(url))
+        self.attempts.pop(key, None)
+        self.settled[key] = (state, error, time.time())
+
+    def checkpoint_due(self):
+        return (len(self.discovered) + len(self.settled) >= self.checkpoint_every
+                or time.monotonic() - self.last_checkpoint >= self.checkpoint_interval)
+
+    # Take the buffered changes, to be written by commit(). Callers that must
+    # persist something else first (crawl_shard flushes the song sink) do it
+    # in between. New URLs depend on nothing else, so with settled=False only
+    # they are taken, to make them claimable without waiting for a checkpoint.
+    def pending_changes(self, settled=True):
+        if not settled:
+            discovered, self.discovered = self.discovered, {}
+            return discovered, {}
+        changes = self.discovered, self.settled
+        self.discovered, self.settled = {}, {}
+        self.last_checkpoint = time.monotonic()
+        return changes
+
+    # Write changes from pending_changes() in one transaction and fold the WAL back
+    def commit(self, changes):
+        discovered, settled = changes
+        if discovered or settled:
+            with self._transaction():
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO urls (key, url, shard, priority, depth, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", discovered.values())
+                self.conn.executemany(
+                    "UPDATE urls SET state = ?, leased_until = NULL, error = ?, updated_at = ? WHERE key = ?",
+                    [(state, error, updated_at, key) for key, (state, error, updated_at) in settled.items()])
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def checkpoint(self):
+        self.commit(self.pending_changes())
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    # Whether any shard still has URLs queued or leased out. Leases that ran out
+    # belong to a worker that is gone and no longer count.
+    def unfinished(self):
+        shards = ", ".join("?" * self.shards)
+        return self.conn.execute(
+            f"SELECT 1 FROM urls WHERE shard IN ({shards}) AND "
+            "(state = ? OR (state = ? AND leased_until >= ?)) LIMIT 1",
+            (*range(self.shards), QUEUED, IN_FLIGHT, time.time())).fetchone() is not None
+
+    # Counts per state across all shards
+    def stats(self):
+        counts = dict.fromkeys(STATE_NAMES.values(), 0)
+        for state, count in self.conn.execute("SELECT state, COUNT(*) FROM urls GROUP BY state"):
+            counts[STATE_NAMES[state]] = count
+        return counts
+
+
+# Crawl one shard, following song links up to `max_depth`, until it has been
+# empty for `idle_timeout` seconds and no shard has URLs queued or in flight:
+# pages other shards are still crawling may link into this one.
+#
+# One worker per crawler slot takes URLs from a local queue, which is topped
+# up with another `batch_size` claimed URLs whenever it runs low, so a slow
+# page never holds the rest of a batch back. At every checkpoint the sink is
+# flushed before the frontier commits, so URLs are only marked done once
+# Mongo has their data; the database work runs in a thread, off the loop.
+async def crawl_shard(frontier, sink, max_depth=1, batch_size=64, idle_timeout=10.0, **crawler_options):
+    from crawler import Crawler
+
+    crawled = 0
+    depths = {}
+    queue = asyncio.Queue()
+    hungry = asyncio.Event()
+
+    async def checkpoint():
+        changes = frontier.pending_changes()
+        await sink.flush_async()
+        await asyncio.to_thread(frontier.commit, changes)
+
+    async with Crawler(**crawler_options) as crawler:
+        low_water = crawler.concurrency
+
+        async def worker():
+            nonlocal crawled
+            while True:
+                url = await queue.get()
+                if queue.qsize() < low_water:
+                    hungry.set()
+                result = await crawler.crawl_one(url)
+                depth = depths.pop(url)
+                if result.ok:
+                    await sink.add_async(result.data)
+                    frontier.done(url)
+                    crawled += 1
+                    if depth < max_depth:
+                        for entry in result.data["samples"] + result.data["sampled_by"]:
+                            if entry.get("song_url"):
+                                frontier.add(entry["song_url"], priority=-(depth + 1), depth=depth + 1)
+                else:
+                    frontier.fail(url, result.error)
+                if frontier.checkpoint_due() or not depths:
+                    hungry.set()
+
+        workers = [asyncio.create_task(worker()) for _ in range(crawler.concurrency)]
+        try:
+            idle_since = None
+            while True:
+                for task in workers:
+                    if task.done():
+                        task.result()  # re-raise a worker's error (e.g. from the sink)
+                if frontier.checkpoint_due():
+                    await checkpoint()
+                if queue.qsize() < low_water:
+                    if frontier.discovered:
+                        await asyncio.to_thread(frontier.commit, frontier.pending_changes(settled=False))
+                    batch = await asyncio.to_thread(frontier.claim, batch_size)
+                    for url, depth in batch:
+                        depths[url] = depth
+                        queue.put_nowait(url)
+                    if batch or depths:
+                        idle_since = None
+                    else:
+                        idle_since = idle_since or time.monotonic()
+                        if time.monotonic() - idle_since >= idle_timeout:
+                            # Our own in-flight URLs are settled but maybe not yet committed
+                            if frontier.settled:
+                                await checkpoint()
+                            if not await asyncio.to_thread(frontier.unfinished):
+                                break
+                hungry.clear()
+                try:
+                    await asyncio.wait_for(hungry.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    await checkpoint()
+    return crawled
+
+
+# One shard's worker process. Shard n serves its metrics on metrics_port + n.
+def _run_worker(path, shard, max_depth, batch_size, concurrency, rate,
+                metrics_port=None, summary_interval=30.0, profile=None):
+    from db import init_mongo, song_collection
+    from metrics import SummaryReporter, profiled, start_metrics_server
+    from mongo_sink import SongSink
+
+    if metrics_port:
+        start_metrics_server(metrics_port + shard)
+    client = init_mongo()
+    try:
+        with Frontier(path, shard=shard, recover=True) as frontier, SongSink(song_collection(client)) as sink, \
+                profiled(profile, output=f"{profile}-shard{shard}.out" if profile else None), \
+                SummaryReporter(summary_interval, use_tqdm=False, prefix=f"shard {shard}"):
+            crawled = asyncio.run(crawl_shard(frontier, sink, max_depth, batch_size,
+                                              concurrency=concurrency, rate=rate,
+                                              parse_workers=max(1, (os.cpu_count() or 1) // frontier.shards)))
+        print(f"[shard {shard}] crawled {crawled} pages. {sink.report()}")
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable, sharded crawl frontier.")
+    parser.add_argument("--path", default=DEFAULT_PATH, help="frontier database path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    seed = commands.add_parser("seed", help="queue song URLs from a file (one per line)")
+    seed.add_argument("urls")
+    seed.add_argument("--shards", type=int, help="number of shards (fixed when the frontier is created)")
+    seed.add_argument("--priority", type=int, default=0)
+    run = commands.add_parser("run", help="crawl every shard, one worker process per shard")
+    run.add_argument("--max-depth", type=int, default=1, help="how many links away from the seeds to follow")
+    run.add_argument("--batch", type=int, default=64, help="URLs claimed at a time")
+    run.add_argument("--concurrency", type=int, default=16, help="pages in flight per worker")
+    run.add_argument("--rate", type=float, default=10.0, help="requests per second, shared by all workers")
+    run.add_argument("--metrics-port", type=int,
+                     help="serve Prometheus metrics locally, shard n on port METRICS_PORT + n")
+    run.add_argument("--summary-interval", type=float, default=30.0, help="seconds between per-shard summaries")
+    run.add_argument("--profile", choices=["cprofile", "tracemalloc"],
+                     help="profile each worker, dumping <mode>-shard<n>.out")
+    commands.add_parser("status", help="show URL counts per state")
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        with Frontier(args.path, shards=args.shards) as frontier, open(args.urls, encoding="utf-8") as f:
+            added = sum(frontier.add(line, args.priority) for line in f if line.strip())
+        print(f"Queued {added} new URLs.")
+    elif args.command == "run":
+        with Frontier(args.path) as frontier:
+            shards = frontier.shards
+        ctx = multiprocessing.get_context("spawn")
+        workers = [ctx.Process(target=_run_worker,
+                               args=(args.path, shard, args.max_depth, args.batch, args.concurrency,
+                                     args.rate / shards, args.metrics_port, args.summary_interval,
+                                     args.profile))
+                   for shard in range(shards)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    with Frontier(args.path) as frontier:
+        print(", ".join(f"{count} {state}" for state, count in frontier.stats().items()))
+
+
+if __name__ == "__main__":
+    main()
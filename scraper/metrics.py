@@ -0,0 +1,327 @@
+import bisect
+import contextlib
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds: 1 ms to ~65 s, doubling
+LATENCY_BUCKETS = tuple(0.001 * 2 ** i for i in range(17))
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+# A metric family; each distinct label value tuple gets its own child
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children.items()):
+            lines.extend(self._expose_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _expose_child(self, values, child):
+        return [f"{self.name}{_label_text(self.label_names, values)} {child.value}"]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    @contextlib.contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    # Estimated q-quantile, interpolated within its bucket
+    def quantile(self, q):
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= target and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+# Fixed-bucket histogram: observe() is a bisect and three increments
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _expose_child(self, values, child):
+        names = self.label_names + ("le",)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f"{self.name}_bucket{_label_text(names, values + (le,))} {cumulative}")
+        labels = _label_text(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    # Prometheus text exposition format
+    def expose(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Crawl metrics, shared by the crawler, parse stage and Mongo sink
+STAGE_SECONDS = REGISTRY.histogram(
+    "crawl_stage_seconds", "Time spent per crawl stage (connect includes DNS resolution).", ["stage"])
+RESPONSES = REGISTRY.counter("crawl_responses_total", "HTTP responses by status code.", ["code"])
+RETRIES = REGISTRY.counter("crawl_retries_total", "Requests retried after an error or retryable status.", ["reason"])
+THROTTLES = REGISTRY.counter(
+    "crawl_throttled_total", "Requests delayed by our rate limiter or by the server (429/Retry-After).", ["source"])
+CACHE_HITS = REGISTRY.counter("crawl_cache_hits_total", "Pages not re-parsed thanks to the crawl index.", ["kind"])
+PAGES = REGISTRY.counter("crawl_pages_total", "Pages crawled, by outcome.", ["outcome"])
+MONGO_DOCS = REGISTRY.counter("crawl_mongo_docs_total", "Song documents written to MongoDB.")
+
+# httpx/httpcore trace events that start and end each network stage
+TRACE_STAGES = {
+    "connection.connect_tcp": "connect",
+    "connection.start_tls": "tls",
+    "http11.receive_response_headers": "ttfb",
+    "http2.receive_response_headers": "ttfb",
+    "http11.receive_response_body": "download",
+    "http2.receive_response_body": "download",
+}
+
+
+# Async httpx `trace` extension recording connect / TLS / TTFB / download times.
+# TTFB runs from the start of sending the request to the end of the response headers.
+def request_tracer():
+    started = {}
+
+    async def trace(event, info):
+        prefix, _, phase = event.rpartition(".")
+        if prefix.endswith("send_request_headers") and phase == "started":
+            started["ttfb"] = time.perf_counter()
+            return
+        stage = TRACE_STAGES.get(prefix)
+        if stage is None:
+            return
+        if phase == "started" and stage != "ttfb":
+            started[stage] = time.perf_counter()
+        elif phase in ("complete", "failed") and stage in started:
+            STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started.pop(stage))
+
+    return trace
+
+
+# Serve REGISTRY at http://<host>:<port>/metrics from a daemon thread
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.expose().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+# One-line summary: page count, p50/p95 per stage, status codes, retries, throttles, cache hits
+def summary_line(registry=REGISTRY):
+    pages = sum(child.value for child in PAGES.children.values())
+    parts = [f"{pages} pages"]
+    for (stage,), child in sorted(STAGE_SECONDS.children.items()):
+        parts.append(f"{stage} p50 {_ms(child.quantile(0.5))} p95 {_ms(child.quantile(0.95))}")
+    codes = " ".join(f"{code}:{child.value}" for (code,), child in sorted(RESPONSES.children.items()))
+    if codes:
+        parts.append(f"status {codes}")
+    for label, metric in (("retries", RETRIES), ("throttled", THROTTLES), ("cache hits", CACHE_HITS)):
+        total = sum(child.value for child in metric.children.values())
+        if total:
+            parts.append(f"{label} {total}")
+    return " | ".join(parts)
+
+
+# Print summary_line() every `interval` seconds, on a tqdm bar when tqdm is installed
+class SummaryReporter:
+    def __init__(self, interval=10.0, use_tqdm=True, prefix="metrics"):
+        self.interval = interval
+        self.use_tqdm = use_tqdm
+        self.prefix = prefix
+        self.stopped = threading.Event()
+        self.thread = None
+        self.bar = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if self.use_tqdm:
+            try:
+                from tqdm import tqdm
+                self.bar = tqdm(unit="page", dynamic_ncols=True)
+            except ImportError:
+                self.bar = None
+        self.thread = threading.Thread(target=self._run, name="metrics-summary", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+        self._report()
+        if self.bar is not None:
+            self.bar.close()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self._report()
+
+    def _report(self):
+        line = summary_line()
+        if self.bar is not None:
+            pages = sum(child.value for child in PAGES.children.values())
+            self.bar.update(pages - self.bar.n)
+            self.bar.set_postfix_str(line.split(" | ", 1)[-1], refresh=True)
+        else:
+            print(f"[{self.prefix}] {line}", flush=True)
+
+
+# Profile a whole run: "cprofile" prints the top functions by cumulative time,
+# "tracemalloc" the top allocation sites; None does nothing
+@contextlib.contextmanager
+def profiled(mode=None, top=20, output=None):
+    if mode is None:
+        yield
+        return
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(top)
+            print(stream.getvalue())
+    elif mode == "tracemalloc":
+        tracemalloc.start(25)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if output:
+                snapshot.dump(output)
+            print(f"tracemalloc: {current / 2**20:.1f} MiB current, {peak / 2**20:.1f} MiB peak")
+            for stat in snapshot.statistics("lineno")[:top]:
+                print(stat)
+    else:
+        raise ValueError(f"unknown profile mode: {mode!r}")
@@ -0,0 +1,213 @@
+import asyncio
+import threading
+import time
+
+from pymongo import UpdateOne
+
+from metrics import MONGO_DOCS, STAGE_SECONDS
+from titles import title_keys
+
+# Array fields merged with $addToSet so re-crawls never duplicate edges
+EDGE_FIELDS = ("samples", "sampled_by")
+# Edge keys, in the order they are stored (subdocument equality is order-sensitive)
+EDGE_KEYS = ("track_name", "artists", "release_year", "additional_info", "url")
+
+
+def _edge(entry):
+    return {key: entry[key] for key in EDGE_KEYS if key in entry}
+
+
+def _edge_key(edge):
+    return tuple(tuple(v) if isinstance(v, list) else v for v in edge.values())
+
+
+# Buffers parsed songs and writes them to the Song collection in bulk.
+#
+# Songs are upserted by original_song with unordered UpdateOne operations,
+# which also set their normalized title `keys` (see titles.title_keys).
+# A background thread flushes whenever `batch_size` songs are pending or
+# `flush_interval` seconds have passed since the last flush; `add` blocks
+# once `max_pending` songs are waiting, so a slow database slows the crawl
+# down instead of growing the buffer without bound. `on_flush`, if given, is
+# called from the flush thread with the songs of every successful bulk write.
+#
+# add() and flush() block the calling thread; coroutines use add_async() and
+# flush_async(), which wait in an executor thread so the event loop keeps going.
+class SongSink:
+    def __init__(self, collection, batch_size=500, flush_interval=2.0, max_pending=None,
+                 on_flush=None):
+        self.collection = collection
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending or batch_size * 4
+
+        self.pending = {}
+        self.cond = threading.Condition()
+        self.closed = False
+        self.flush_waiters = 0
+        self.writing = False
+        # add() calls so far, and how many of them are known to be written
+        self.added = 0
+        self.written = 0
+        self.error = None
+        self.thread = None
+
+        self.docs = 0
+        self.flushes = 0
+        self.upserted = 0
+        self.modified = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.started = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, name="song-sink", daemon=True)
+        self.thread.start()
+
+    # Queue one parsed song; songs with the same original_song are merged in the buffer
+    def add(self, song):
+        with self.cond:
+            while len(self.pending) >= self.max_pending and not self.error:
+                self.cond.wait()
+            if self.error:
+                raise self.error
+            key = song["original_song"]
+            merged = self.pending.get(key)
+            if merged is None:
+                merged = self.pending[key] = {"set": {}, **{field: {} for field in EDGE_FIELDS}}
+            merged["set"].update({k: v for k, v in song.items() if k not in EDGE_FIELDS})
+            for field in EDGE_FIELDS:
+                for entry in song.get(field, []):
+                    edge = _edge(entry)
+                    merged[field].setdefault(_edge_key(edge), edge)
+            self.added += 1
+            if len(self.pending) >= self.batch_size:
+                self.cond.notify_all()
+
+    # Block until everything added so far has been written. Songs added while
+    # waiting do not hold the flush up.
+    def flush(self):
+        with self.cond:
+            target = self.added
+            self.flush_waiters += 1
+            self.cond.notify_all()
+            try:
+                while self.written < target and not self.error:
+                    self.cond.wait()
+            finally:
+                self.flush_waiters -= 1
+            if self.error:
+                raise self.error
+
+    async def add_async(self, song):
+        with self.cond:
+            if len(self.pending) < self.max_pending or self.error:
+                self.add(song)
+                return
+        await asyncio.get_running_loop().run_in_executor(None, self.add, song)
+
+    async def flush_async(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    # Flush everything still buffered and stop the background thread
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.error:
+            raise self.error
+
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            with self.cond:
+                while (not self.closed and not (self.flush_waiters and self.pending)
+                       and len(self.pending) < self.batch_size
+                       and time.monotonic() < deadline):
+                    self.cond.wait(max(0.0, deadline - time.monotonic()))
+                batch, self.pending = self.pending, {}
+                taken = self.added
+                closed = self.closed
+                self.writing = bool(batch)
+                if not batch:
+                    self.written = taken
+                self.cond.notify_all()
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    with self.cond:
+                        self.error = e
+                        self.writing = False
+                        self.cond.notify_all()
+                    return
+                with self.cond:
+                    self.writing = False
+                    self.written = taken
+                    self.cond.notify_all()
+            deadline = time.monotonic() + self.flush_interval
+            if closed:
+                return
+
+    def _write(self, batch):
+        ops = []
+        for original_song, song in batch.items():
+            update = {"$set": {**song["set"], "keys": title_keys(original_song)}}
+            add_to_set = {field: {"$each": list(song[field].values())}
+                          for field in EDGE_FIELDS if song[field]}
+            if add_to_set:
+                update["$addToSet"] = add_to_set
+            ops.append(UpdateOne({"original_song": original_song}, update, upsert=True))
+
+        started = time.perf_counter()
+        result = self.collection.bulk_write(ops, ordered=False)
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels("mongo_write").observe(elapsed)
+        MONGO_DOCS.inc(len(ops))
+
+        self.docs += len(ops)
+        self.flushes += 1
+        self.upserted += result.upserted_count
+        self.modified += result.modified_count
+        self.flush_seconds += elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        if self.on_flush:
+            self.on_flush([song["set"] for song in batch.values()])
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            "docs": self.docs,
+            "flushes": self.flushes,
+            "upserted": self.upserted,
+            "modified": self.modified,
+            "docs_per_sec": self.docs / elapsed if elapsed else 0.0,
+            "avg_flush_ms": 1000 * self.flush_seconds / self.flushes if self.flushes else 0.0,
+            "max_flush_ms": 1000 * self.max_flush_seconds,
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"Wrote {s['docs']} songs in {s['flushes']} flushes "
+                f"({s['upserted']} new, {s['modified']} updated): "
+                f"{s['docs_per_sec']:.1f} docs/sec, "
+                f"flush latency avg {s['avg_flush_ms']:.1f} ms / max {s['max_flush_ms']:.1f} ms")
+
+
+# Index the upsert key so each UpdateOne is a point lookup instead of a scan,
+# and the normalized title keys the backend's /tree fallback looks songs up by
+def ensure_indexes(collection):
+    collection.create_index("original_song")
+    collection.create_index("keys")
@@ -0,0 +1,42 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from song_parser import parse_song_data
+
+
+# Parses song pages in a pool of worker processes, off the crawler's event loop.
+#
+# Fetchers await parse(); at most `max_pending` pages (default: two per
+# worker, one parsing and one queued) are queued or being parsed at once.
+# When the parsers fall behind, the other fetchers wait for a slot with
+# their page in hand instead of fetching more.
+class ParsePool:
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.executor = None
+        self.slots = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        # spawn, not fork: the crawler process already runs threads (sink flusher, httpx)
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self.slots = asyncio.Semaphore(self.max_pending)
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def parse(self, content, url=""):
+        async with self.slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, parse_song_data, content, url)
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import queue
+import re
+import time
+from datetime import datetime
+
+from crawl_index import DEFAULT_PATH, CrawlIndex, data_hash
+from crawler import Crawler
+from db import init_mongo, song_collection
+from metrics import SummaryReporter, profiled, start_metrics_server
+from mongo_sink import SongSink, ensure_indexes
+
+SUMMARY_FIELDS = ("skipped", "not_modified", "unchanged", "reparsed", "rewritten", "failed")
+
+
+# Parse --since: a relative age like "7d", "12h", "30m" or an ISO date/datetime
+def parse_since(value):
+    match = re.fullmatch(r"(\d+)([dhm])", value)
+    if match:
+        seconds = int(match.group(1)) * {"d": 86400, "h": 3600, "m": 60}[match.group(2)]
+        return time.time() - seconds
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid --since value: {value!r}")
+
+
+# Re-crawl `urls`, writing only songs whose parsed data changed.
+#
+# Index entries for rewritten pages are only stored once the sink has flushed
+# them, so a crash never leaves the index claiming data Mongo does not have.
+async def refresh(urls, index, collection, full=False, since=None, **crawler_options):
+    summary = dict.fromkeys(SUMMARY_FIELDS, 0)
+    pending = {}
+    flushed = queue.SimpleQueue()
+
+    def on_flush(songs):
+        for song in songs:
+            flushed.put(song["original_song"])
+
+    def record_flushed():
+        while not flushed.empty():
+            for url, validators in pending.pop(flushed.get(), []):
+                index.record(url, **validators)
+                summary["rewritten"] += 1
+
+    to_fetch = []
+    for url in urls:
+        entry = index.get(url)
+        if not full and since is not None and entry and entry["checked_at"] >= since:
+            summary["skipped"] += 1
+        else:
+            to_fetch.append(url)
+
+    with SongSink(collection, on_flush=on_flush) as sink:
+        async with Crawler(index=index, full=full, **crawler_options) as crawler:
+            async for result in crawler.crawl(to_fetch):
+                entry = index.get(result.url)
+                if result.unchanged:
+                    summary["not_modified" if result.status == 304 else "unchanged"] += 1
+                    if result.validators:
+                        index.record(result.url, data_hash=entry["data_hash"], **result.validators)
+                    else:
+                        index.touch(result.url)
+                elif not result.ok:
+                    summary["failed"] += 1
+                    print(f"{result.url}: failed ({result.error})")
+                else:
+                    summary["reparsed"] += 1
+                    digest = data_hash(result.data)
+                    if not full and entry and entry["data_hash"] == digest:
+                        index.record(result.url, data_hash=digest, **result.validators)
+                    else:
+                        pending.setdefault(result.data["original_song"], []).append(
+                            (result.url, dict(result.validators, data_hash=digest)))
+                        await sink.add_async(result.data)
+                record_flushed()
+    record_flushed()
+    print(sink.report())
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally re-crawl song pages into whosampled_db.Song.")
+    parser.add_argument("urls", nargs="?",
+                        help="file with one song URL per line (default: every URL in the index)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--full", action="store_true",
+                      help="ignore the index: re-fetch, re-parse and rewrite every page")
+    mode.add_argument("--since", type=parse_since,
+                      help="skip pages checked after this time (e.g. 7d, 12h, 2024-11-01)")
+    parser.add_argument("--index", default=DEFAULT_PATH, help="crawl index path")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=10.0, help="requests per second")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this local port")
+    parser.add_argument("--summary-interval", type=float, default=10.0, help="seconds between progress summaries")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"], help="profile the whole run")
+    parser.add_argument("--profile-output", help="also dump the raw profile to this file")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+    client = init_mongo()
+    collection = song_collection(client)
+    ensure_indexes(collection)
+    started = time.perf_counter()
+    try:
+        with CrawlIndex(args.index) as index:
+            if args.urls:
+                with open(args.urls, encoding="utf-8") as f:
+                    urls = [line.strip() for line in f if line.strip()]
+            else:
+                urls = index.urls()
+            with profiled(args.profile, output=args.profile_output), SummaryReporter(args.summary_interval):
+                summary = asyncio.run(refresh(urls, index, collection, full=args.full, since=args.since,
+                                              concurrency=args.concurrency, rate=args.rate))
+    finally:
+        client.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Refreshed {len(urls)} pages in {elapsed:.2f}s: "
+          + ", ".join(f"{summary[field]} {field.replace('_', ' ')}" for field in SUMMARY_FIELDS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import time
+from array import array
+from collections import deque
+
+from pymongo import ReplaceOne
+
+from titles import normalize_title, song_name, title_keys
+
+SAMPLED_BY = "sampled_by"
+SAMPLES = "samples"
+# tree_cache documents list every prefix of their keys up to this many characters,
+# so autocomplete is an indexed equality match already in weight order
+PREFIX_LENGTH = 10
+
+
+# Compressed sparse rows: row n's neighbours are edges[offsets[n]:offsets[n + 1]],
+# sorted and without duplicates
+def _csr(src, dst, node_count):
+    counts = array("I", [0]) * (node_count + 1)
+    for s in src:
+        counts[s + 1] += 1
+    for n in range(node_count):
+        counts[n + 1] += counts[n]
+
+    edges = array("I", [0]) * len(src)
+    cursor = array("I", counts)
+    for s, d in zip(src, dst):
+        edges[cursor[s]] = d
+        cursor[s] += 1
+    del cursor
+
+    # Sort and dedupe each row in place, compacting the edge array as we go
+    offsets = array("I", [0]) * (node_count + 1)
+    write = 0
+    for n in range(node_count):
+        row = sorted(set(edges[counts[n]:counts[n + 1]]))
+        edges[write:write + len(row)] = array("I", row)
+        write += len(row)
+        offsets[n + 1] = write
+    del edges[write:]
+    return offsets, edges
+
+
+# Nested {name, children} tree rooted at node_id, breadth first to `depth` levels,
+# over any graph exposing `names[node_id]` and `neighbours(node_id, direction)`.
+#
+# Each node is expanded at most once per tree: later occurrences (including
+# cycles back to an ancestor) are emitted as leaves marked "repeat", and
+# expansion stops once `max_nodes` nodes have been emitted.
+def bfs_tree(names, neighbours, node_id, direction=SAMPLED_BY, depth=3, max_nodes=500):
+    root = {"name": names[node_id], "children": []}
+    seen = {node_id}
+    emitted = 1
+    queue = deque([(root, node_id, 0)])
+    while queue:
+        parent, current, level = queue.popleft()
+        if level >= depth:
+            continue
+        for child_id in neighbours(current, direction):
+            if emitted >= max_nodes:
+                parent["truncated"] = True
+                break
+            emitted += 1
+            child = {"name": names[child_id]}
+            if child_id in seen:
+                child["repeat"] = True
+            else:
+                seen.add(child_id)
+                child["children"] = []
+                queue.append((child, child_id, level + 1))
+            parent["children"].append(child)
+    return root, emitted
+
+
+# In-memory sample graph with integer node IDs and array-backed edge lists.
+#
+# Nodes are interned by normalized "Artist - Title" name. Edges point from a
+# song to the songs that sampled it; freeze() turns the collected edge pairs
+# into CSR arrays for both directions, which is all the traversals need.
+class SampleGraph:
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.songs = array("I")
+        self.src = array("I")
+        self.dst = array("I")
+        self.rows = None
+
+    def node(self, name):
+        key = normalize_title(name)
+        node_id = self.ids.get(key)
+        if node_id is None:
+            node_id = self.ids[key] = len(self.names)
+            self.names.append(name)
+        return node_id
+
+    # `sampler` contains a sample of `sampled`
+    def add_edge(self, sampled, sampler):
+        self.src.append(sampled)
+        self.dst.append(sampler)
+
+    # Add one Song document ({original_song, samples, sampled_by})
+    def add_song(self, doc):
+        song = self.node(doc["original_song"])
+        self.songs.append(song)
+        for entry in doc.get("sampled_by") or []:
+            self.add_edge(song, self.node(song_name(entry["track_name"], entry["artists"])))
+        for entry in doc.get("samples") or []:
+            self.add_edge(self.node(song_name(entry["track_name"], entry["artists"])), song)
+
+    @classmethod
+    def from_collection(cls, collection, batch_size=1000):
+        graph = cls()
+        cursor = collection.find({}, {"_id": 0, "original_song": 1, "samples": 1, "sampled_by": 1},
+                                 batch_size=batch_size)
+        for doc in cursor:
+            if doc.get("original_song"):
+                graph.add_song(doc)
+        graph.freeze()
+        return graph
+
+    # Build both CSR directions and release the edge pair arrays
+    def freeze(self):
+        node_count = len(self.names)
+        self.rows = {
+            SAMPLED_BY: _csr(self.src, self.dst, node_count),
+            SAMPLES: _csr(self.dst, self.src, node_count),
+        }
+        self.src, self.dst = array("I"), array("I")
+        self.songs = array("I", sorted(set(self.songs)))
+
+    @property
+    def edge_count(self):
+        return len(self.rows[SAMPLED_BY][1])
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for offsets, edges in self.rows.values() for a in (offsets, edges))
+
+    def neighbours(self, node_id, direction=SAMPLED_BY):
+        offsets, edges = self.rows[direction]
+        return edges[offsets[node_id]:offsets[node_id + 1]]
+
+    # Nested {name, children} tree rooted at node_id; see bfs_tree
+    def tree(self, node_id, direction=SAMPLED_BY, depth=3, max_nodes=500):
+        return bfs_tree(self.names, self.neighbours, node_id, direction, depth, max_nodes)
+
+    # tree_cache document for one node, looked up by either of its keys
+    def cache_document(self, node_id, depth=3, max_nodes=500):
+        name = self.names[node_id]
+        keys = title_keys(name)
+        sampled_by, sampled_by_count = self.tree(node_id, SAMPLED_BY, depth, max_nodes)
+        samples, samples_count = self.tree(node_id, SAMPLES, depth, max_nodes)
+        return {
+            "_id": normalize_title(name),
+            "keys": keys,
+            "prefixes": sorted({key[:n] for key in keys for n in range(1, min(len(key), PREFIX_LENGTH) + 1)}),
+            "original_song": name,
+            "depth": depth,
+            "weight": len(self.neighbours(node_id, SAMPLED_BY)) + len(self.neighbours(node_id, SAMPLES)),
+            "node_count": sampled_by_count + samples_count - 1,
+            "sampled_by": sampled_by["children"],
+            "samples": samples["children"],
+        }
+
+
+# Materialize a tree_cache document for every Song, writing in bulk batches.
+#
+# Every document is stamped with this run's `build` id. Once all of them are
+# written, documents from earlier builds are deleted; otherwise a song whose
+# key changed (say, after a normalize_title change) would keep its old
+# document and could still be served. Returns (written, deleted).
+def write_tree_cache(graph, collection, depth=3, max_nodes=500, batch_size=500, nodes=None):
+    collection.create_index([("keys", 1), ("weight", -1)])
+    collection.create_index([("prefixes", 1), ("weight", -1)])
+    build = time.time_ns()
+    ops = []
+    written = 0
+    for node_id in graph.songs if nodes is None else nodes:
+        doc = graph.cache_document(node_id, depth, max_nodes)
+        doc["build"] = build
+        ops.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        written += len(ops)
+    deleted = collection.delete_many({"build": {"$ne": build}}).deleted_count
+    return written, deleted
+
+
+def main():
+    from db import DB_NAME, init_mongo
+
+    parser = argparse.ArgumentParser(description="Precompute multi-level sample trees into tree_cache.")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--max-nodes", type=int, default=500, help="cap on nodes per tree")
+    parser.add_argument("--all-nodes", action="store_true",
+                        help="also materialize songs that only appear as samples")
+    args = parser.parse_args()
+
+    client = init_mongo()
+    try:
+        db = client[DB_NAME]
+        started = time.perf_counter()
+        graph = SampleGraph.from_collection(db["Song"])
+        print(f"Loaded {len(graph.names)} songs and {graph.edge_count} edges "
+              f"({graph.nbytes() / 2**20:.1f} MiB of edge arrays) in {time.perf_counter() - started:.2f}s.")
+
+        started = time.perf_counter()
+        nodes = range(len(graph.names)) if args.all_nodes else None
+        written, deleted = write_tree_cache(graph, db["tree_cache"], args.depth, args.max_nodes, nodes=nodes)
+        print(f"Wrote {written} trees to tree_cache and removed {deleted} stale ones "
+              f"in {time.perf_counter() - started:.2f}s.")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import argparse
+import bisect
+import heapq
+import os
+import pickle
+import time
+from array import array
+from collections import defaultdict
+
+from titles import normalize_title, title_part
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_index.pickle")
+
+# Rank tiers, best first
+EXACT, PREFIX, WORD_PREFIX, FUZZY = 0, 1, 2, 3
+
+# Sorted keys are "<normalized key>\0<node id>"; \0 sorts before any title character
+SEPARATOR = "\0"
+# Sorts after every character a normalized key can contain
+KEY_END = chr(0x10FFFF)
+# Key scores: weight, plus PRIMARY for a song's full name or title (not a word suffix)
+PRIMARY = 1 << 31
+MAX_WEIGHT = PRIMARY - 1
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Title search index: exact / prefix matches from a sorted key list, typos
+# and partial words from trigram posting lists.
+#
+# Every song is indexed under its normalized full name, its normalized title
+# and each word suffix of the title ("amen brother", "brother"), so "amen",
+# "winstons amen" and "brother" all hit by prefix. Matches on the full name or
+# title rank above word-suffix matches; ties are broken by `weights` (how
+# connected the song is), then by shorter names.
+#
+# A prefix matches a contiguous range of the sorted keys, which can be most
+# of the index for a one-letter query. A max-segment tree over the key scores
+# yields any range's keys best first in O(log n) each, so only the winners
+# are looked at, however long the query.
+class SearchIndex:
+    def __init__(self, names, weights=None, state=None):
+        self.names = list(names)
+        self.weights = array("I", weights if weights is not None else [0] * len(self.names))
+        if state is None:
+            state = self._build()
+        elif "tree" not in state:
+            raise ValueError("search index was saved by an older version; rebuild it")
+        self.full_keys = state["full_keys"]
+        self.titles = state["titles"]
+        self.keys = state["keys"]
+        self.scores = state["scores"]
+        self.tree = state["tree"]
+        self.postings = state["postings"]
+
+    def _build(self):
+        entries = []
+        postings = defaultdict(lambda: array("I"))
+        full_keys = []
+        titles = []
+        for node_id, name in enumerate(self.names):
+            full = normalize_title(name)
+            title = normalize_title(title_part(name))
+            full_keys.append(full)
+            titles.append(title)
+
+            weight = min(self.weights[node_id], MAX_WEIGHT)
+            words = title.split()
+            for key in {full, title, *(" ".join(words[i:]) for i in range(1, len(words)))}:
+                primary = key == full or key == title
+                entries.append((f"{key}{SEPARATOR}{node_id}", weight + PRIMARY if primary else weight))
+
+            for gram in trigrams(full):
+                postings[gram].append(node_id)
+
+        entries.sort()
+        scores = array("I", (score for _, score in entries))
+        return {
+            "full_keys": full_keys,
+            "titles": titles,
+            "keys": [key for key, _ in entries],
+            "scores": scores,
+            "tree": _max_tree(scores),
+            "postings": dict(postings),
+        }
+
+    @classmethod
+    def from_graph(cls, graph):
+        from sample_graph import SAMPLED_BY, SAMPLES
+
+        weights = [len(graph.neighbours(n, SAMPLED_BY)) + len(graph.neighbours(n, SAMPLES))
+                   for n in range(len(graph.names))]
+        return cls(graph.names, weights)
+
+    # Keys are stored pre-sorted, so loading skips normalization and sorting
+    def save(self, path=DEFAULT_PATH):
+        state = {
+            "names": self.names,
+            "weights": self.weights,
+            "full_keys": self.full_keys,
+            "titles": self.titles,
+            "keys": self.keys,
+            "scores": self.scores,
+            "tree": self.tree,
+            "postings": self.postings,
+        }
+        with open(path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        return cls(state.pop("names"), state.pop("weights"), state)
+
+    def _rank(self, tier, node_id, similarity=1.0):
+        return (tier, -similarity, -self.weights[node_id], len(self.names[node_id]))
+
+    # Positions of keys[lo:hi], highest score first.
+    # Heap entries are (-score, -node): among equal scores the deepest node pops
+    # first, so tied subtrees are descended one at a time instead of all expanded
+    # before the first leaf comes out.
+    def _best_in_range(self, lo, hi):
+        size = len(self.tree) // 2
+        heap = []
+        lo += size
+        hi += size
+        while lo < hi:
+            if lo & 1:
+                heap.append((-self.scores[self.tree[lo]], -lo))
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                heap.append((-self.scores[self.tree[hi]], -hi))
+            lo //= 2
+            hi //= 2
+        heapq.heapify(heap)
+        while heap:
+            _, node = heapq.heappop(heap)
+            node = -node
+            if node >= size:
+                yield node - size
+                continue
+            for child in (2 * node, 2 * node + 1):
+                heapq.heappush(heap, (-self.scores[self.tree[child]], -child))
+
+    # Up to `limit` distinct songs with a key in [lo_key, hi_key), best first
+    def _prefix_matches(self, lo_key, hi_key, limit):
+        lo = bisect.bisect_left(self.keys, lo_key)
+        hi = bisect.bisect_left(self.keys, hi_key, lo)
+        found = set()
+        for position in self._best_in_range(lo, hi):
+            match, node_id = self.keys[position].rsplit(SEPARATOR, 1)
+            node_id = int(node_id)
+            if node_id not in found:
+                found.add(node_id)
+                yield match, node_id, self.scores[position] >= PRIMARY
+                if len(found) >= limit:
+                    return
+
+    # Songs sharing the most trigrams with `key`, scored by Jaccard similarity
+    def _fuzzy_matches(self, key, limit, min_similarity=0.3, max_postings=5000):
+        grams = trigrams(key)
+        # Skip very common trigrams; the rarer ones are enough to find candidates
+        usable = sorted((self.postings[g] for g in grams if g in self.postings), key=len)
+        counts = defaultdict(int)
+        for posting in usable:
+            if len(posting) > max_postings and counts:
+                break
+            for node_id in posting:
+                counts[node_id] += 1
+        best = heapq.nlargest(limit * 4, counts.items(), key=lambda item: item[1])
+        for node_id, shared in best:
+            candidate = trigrams(self.full_keys[node_id])
+            similarity = len(grams & candidate) / len(grams | candidate)
+            if similarity >= min_similarity:
+                yield node_id, similarity
+
+    # Ranked (name, node_id) candidates for a free-form query
+    def search(self, query, limit=10, fuzzy=True):
+        key = normalize_title(query)
+        if not key:
+            return []
+        ranked = {}
+
+        def offer(node_id, tier, similarity=1.0):
+            rank = self._rank(tier, node_id, similarity)
+            if node_id not in ranked or rank < ranked[node_id]:
+                ranked[node_id] = rank
+
+        # The best exact matches, then the best of the whole prefix range; together
+        # they contain the top `limit` (extra candidates cover ties on name length)
+        candidates = limit * 2
+        for lo_key, hi_key in ((key + SEPARATOR, key + chr(1)), (key, key + KEY_END)):
+            for match, node_id, primary in self._prefix_matches(lo_key, hi_key, candidates):
+                if not primary:
+                    offer(node_id, WORD_PREFIX)
+                else:
+                    offer(node_id, EXACT if match == key else PREFIX)
+
+        if fuzzy and len(ranked) < limit:
+            for node_id, similarity in self._fuzzy_matches(key, limit):
+                offer(node_id, FUZZY, similarity)
+
+        best = heapq.nsmallest(limit, ranked.items(), key=lambda item: item[1])
+        return [(self.names[node_id], node_id) for node_id, _ in best]
+
+
+# Bottom-up max-segment tree: tree[n] is the position of the highest score under
+# node n, leaves at tree[size + i]. Padding leaves point one past the end,
+# which gets a score of 0 and is never inside a queried range.
+def _max_tree(scores):
+    n = len(scores)
+    size = 1
+    while size < n:
+        size *= 2
+    scores.append(0)
+    tree = array("I", [n]) * (2 * size)
+    tree[size:size + n] = array("I", range(n))
+    for node in range(size - 1, 0, -1):
+        left, right = tree[2 * node], tree[2 * node + 1]
+        tree[node] = left if scores[left] >= scores[right] else right
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the title search index.")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="build the index from whosampled_db.Song")
+    query = commands.add_parser("query", help="query a saved index")
+    query.add_argument("text")
+    query.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from db import init_mongo, song_collection
+        from sample_graph import SampleGraph
+
+        client = init_mongo()
+        try:
+            graph = SampleGraph.from_collection(song_collection(client))
+        finally:
+            client.close()
+        started = time.perf_counter()
+        index = SearchIndex.from_graph(graph)
+        index.save(args.path)
+        print(f"Indexed {len(index.names)} songs ({len(index.keys)} keys, {len(index.postings)} trigrams) "
+              f"in {time.perf_counter() - started:.2f}s -> {args.path}")
+    else:
+        started = time.perf_counter()
+        index = SearchIndex.load(args.path)
+        loaded = time.perf_counter()
+        results = index.search(args.text, args.limit)
+        elapsed = time.perf_counter() - loaded
+        for name, _ in results:
+            print(name)
+        print(f"{len(results)} results in {elapsed * 1000:.3f} ms (index loaded in {loaded - started:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from sample_graph import SAMPLED_BY, SAMPLES, SampleGraph, bfs_tree
+from titles import normalize_title, title_part
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_graph.snapshot")
+
+MAGIC = b"WSSNAP\0\0"
+VERSION = 1
+# Written in native byte order; a reader on the other endianness sees it swapped
+BYTE_ORDER_MARK = 0x01020304
+
+# Sections, in file order. All but `strings` are uint32 arrays.
+#   string_offsets  string n is strings[string_offsets[n]:string_offsets[n + 1]] (UTF-8)
+#   names           string ID of each node's "Artist - Title" name
+#   *_offsets/edges CSR rows for each direction, as in SampleGraph
+#   title_keys      string IDs of normalized title keys, sorted; each node has two,
+#                   its full name and its title alone, like tree_cache keys
+#   title_nodes     node for each title key; heavier nodes first among equal keys
+SECTIONS = ("string_offsets", "strings", "names",
+            "sampled_by_offsets", "sampled_by_edges", "samples_offsets", "samples_edges",
+            "title_keys", "title_nodes")
+HEADER = struct.Struct("=8sII" + "QQ" * len(SECTIONS))
+ALIGNMENT = 8
+
+
+# Interned strings: each distinct string is stored once and referred to by ID
+class _StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.offsets = array("I", [0])
+        self.data = bytearray()
+
+    def intern(self, text):
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.offsets) - 1
+            self.data += text.encode("utf-8")
+            self.offsets.append(len(self.data))
+        return string_id
+
+
+# Write a frozen SampleGraph to `path` as a snapshot.
+#
+# The file is written next to `path` and renamed over it, so processes that
+# still have the previous snapshot mapped keep reading a consistent file.
+def write_snapshot(graph, path=DEFAULT_PATH):
+    strings = _StringTable()
+    names = array("I", (strings.intern(name) for name in graph.names))
+
+    weights = [len(graph.neighbours(n, SAMPLED_BY)) + len(graph.neighbours(n, SAMPLES))
+               for n in range(len(graph.names))]
+    entries = set()
+    for node_id, name in enumerate(graph.names):
+        for key in (normalize_title(name), normalize_title(title_part(name))):
+            entries.add((key, -weights[node_id], node_id))
+    # str order is code point order, which is also UTF-8 byte order
+    entries = sorted(entries)
+    title_keys = array("I", (strings.intern(key) for key, _, _ in entries))
+    title_nodes = array("I", (node_id for _, _, node_id in entries))
+
+    sections = {
+        "string_offsets": strings.offsets,
+        "strings": strings.data,
+        "names": names,
+        "sampled_by_offsets": graph.rows[SAMPLED_BY][0],
+        "sampled_by_edges": graph.rows[SAMPLED_BY][1],
+        "samples_offsets": graph.rows[SAMPLES][0],
+        "samples_edges": graph.rows[SAMPLES][1],
+        "title_keys": title_keys,
+        "title_nodes": title_nodes,
+    }
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        layout = []
+        for name in SECTIONS:
+            f.write(b"\0" * (-f.tell() % ALIGNMENT))
+            start = f.tell()
+            f.write(sections[name])
+            layout += [start, f.tell() - start]
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER_MARK, *layout))
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+# Node names, decoded from the mapped string table on access
+class _Names:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return len(self.snapshot.names_ids)
+
+    def __getitem__(self, node_id):
+        return self.snapshot.string(self.snapshot.names_ids[node_id])
+
+
+# Read-only view of a snapshot file, mapped into memory.
+#
+# Opening only maps the file and checks the header; arrays are memoryviews
+# over the mapping and strings are decoded on access, so startup does not
+# depend on graph size and the pages are shared by every process reading
+# the same file.
+class Snapshot:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, byte_order, *layout = HEADER.unpack_from(self.map)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a sample graph snapshot")
+            if version != VERSION:
+                raise ValueError(f"{path} has snapshot version {version}, expected {VERSION}")
+            if byte_order != BYTE_ORDER_MARK:
+                raise ValueError(f"{path} was written on a machine with the other byte order")
+
+            self.view = memoryview(self.map)
+            self.sections = {}
+            for name, start, size in zip(SECTIONS, layout[0::2], layout[1::2]):
+                section = self.view[start:start + size]
+                self.sections[name] = section if name == "strings" else section.cast("I")
+        except Exception:
+            self.close()
+            raise
+
+        self.string_offsets = self.sections["string_offsets"]
+        self.strings = self.sections["strings"]
+        self.names_ids = self.sections["names"]
+        self.title_keys = self.sections["title_keys"]
+        self.title_nodes = self.sections["title_nodes"]
+        self.rows = {
+            SAMPLED_BY: (self.sections["sampled_by_offsets"], self.sections["sampled_by_edges"]),
+            SAMPLES: (self.sections["samples_offsets"], self.sections["samples_edges"]),
+        }
+        self.names = _Names(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Views must be released before the mapping can be closed
+    def close(self):
+        for section in getattr(self, "sections", {}).values():
+            section.release()
+        self.sections = {}
+        if getattr(self, "view", None) is not None:
+            self.view.release()
+            self.view = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    @property
+    def node_count(self):
+        return len(self.names_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.rows[SAMPLED_BY][1])
+
+    def _string_bytes(self, string_id):
+        return bytes(self.strings[self.string_offsets[string_id]:self.string_offsets[string_id + 1]])
+
+    def string(self, string_id):
+        return str(self._string_bytes(string_id), "utf-8")
+
+    # A copy, like SampleGraph.neighbours, so callers can keep it after close()
+    def neighbours(self, node_id, direction=SAMPLED_BY):
+        return array("I", self._neighbours(node_id, direction))
+
+    # A view into the mapping; only for callers that drop it before close()
+    def _neighbours(self, node_id, direction=SAMPLED_BY):
+        offsets, edges = self.rows[direction]
+        return edges[offsets[node_id]:offsets[node_id + 1]]
+
+    # Node for a song or title, by binary search over the normalized title keys.
+    # A bare title matching several songs resolves to the most connected one.
+    def find(self, title):
+        key = normalize_title(title).encode("utf-8")
+        lo, hi = 0, len(self.title_keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string_bytes(self.title_keys[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.title_keys) and self._string_bytes(self.title_keys[lo]) == key:
+            return self.title_nodes[lo]
+        return None
+
+    def tree(self, node_id, direction=SAMPLED_BY, depth=3, max_nodes=500):
+        return bfs_tree(self.names, self._neighbours, node_id, direction, depth, max_nodes)
+
+    # Sample trees in both directions for a title, shaped like a tree_cache document
+    def trees_for(self, title, depth=3, max_nodes=500):
+        node_id = self.find(title)
+        if node_id is None:
+            return None
+        sampled_by, sampled_by_count = self.tree(node_id, SAMPLED_BY, depth, max_nodes)
+        samples, samples_count = self.tree(node_id, SAMPLES, depth, max_nodes)
+        return {
+            "original_song": self.names[node_id],
+            "depth": depth,
+            "node_count": sampled_by_count + samples_count - 1,
+            "sampled_by": sampled_by["children"],
+            "samples": samples["children"],
+        }
+
+
+def _print_tree(node, indent=0):
+    marker = " (repeat)" if node.get("repeat") else " ..." if node.get("truncated") else ""
+    print(f"{'  ' * indent}{node['name']}{marker}")
+    for child in node.get("children", []):
+        _print_tree(child, indent + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the sample graph to an mmap-able snapshot and query it.")
+    parser.add_argument("--path", default=DEFAULT_PATH, help="snapshot path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export", help="snapshot whosampled_db.Song")
+    tree = commands.add_parser("tree", help="print the sample trees for a title")
+    tree.add_argument("title")
+    tree.add_argument("--depth", type=int, default=3)
+    tree.add_argument("--max-nodes", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from db import DB_NAME, init_mongo
+
+        client = init_mongo()
+        try:
+            started = time.perf_counter()
+            graph = SampleGraph.from_collection(client[DB_NAME]["Song"])
+            loaded = time.perf_counter()
+            size = write_snapshot(graph, args.path)
+        finally:
+            client.close()
+        print(f"Loaded {len(graph.names)} songs and {graph.edge_count} edges in {loaded - started:.2f}s, "
+              f"wrote {size / 2**20:.1f} MiB to {args.path} in {time.perf_counter() - loaded:.2f}s.")
+    elif args.command == "tree":
+        started = time.perf_counter()
+        with Snapshot(args.path) as snapshot:
+            opened = time.perf_counter()
+            trees = snapshot.trees_for(args.title, args.depth, args.max_nodes)
+            if trees is None:
+                sys.exit(f"No song matches {args.title!r}.")
+            print(f"{trees['original_song']} (snapshot opened in {(opened - started) * 1000:.1f} ms, "
+                  f"{trees['node_count']} nodes in {(time.perf_counter() - opened) * 1000:.1f} ms)")
+            for direction in (SAMPLED_BY, SAMPLES):
+                print(f"\n{direction}:")
+                for child in trees[direction]:
+                    _print_tree(child, 1)
+
+
+if __name__ == "__main__":
+    main()
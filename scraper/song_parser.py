@@ -0,0 +1,89 @@
+from urllib.parse import quote
+
+from lxml import etree
+
+BASE_URL = "https://www.whosampled.com"
+
+# Section headers on a song page, mapped to the field they populate
+SECTIONS = {
+    "contains samples of": "samples",
+    "sampled in": "sampled_by",
+}
+
+# One parser and precompiled XPath queries, reused for every page
+HTML_PARSER = etree.HTMLParser(remove_comments=True, remove_pis=True, no_network=True)
+TITLE = etree.XPath("normalize-space(//h1/meta[@itemprop='name']/@content)")
+ARTIST = etree.XPath("normalize-space(//h1//div[@itemprop='byArtist']/meta[@itemprop='name']/@content)")
+SECTION_HEADERS = etree.XPath("//h3[@class='section-header-title']")
+SECTION_ROWS = etree.XPath("ancestor::section[1]//table[@class='table tdata']/tbody/tr")
+TRACK_NAME = etree.XPath("normalize-space(td[@class='tdata__td2']/a[@class='trackName playIcon'])")
+META_CELLS = etree.XPath("td[@class='tdata__td3']")
+LINKS = etree.XPath(".//a")
+FIRST_HREF = etree.XPath("string((.//a[@href])[1]/@href)")
+TEXT = etree.XPath("normalize-space()")
+
+
+# Check if CAPTCHA is present
+def is_captcha_present(html_content):
+    return b"g-recaptcha" in _as_bytes(html_content)
+
+
+# Pages without the main layout were served as a JS shell and need a real browser
+def needs_javascript(html_content):
+    return b"divided-layout" not in _as_bytes(html_content)
+
+
+def _as_bytes(html_content):
+    if isinstance(html_content, str):
+        return html_content.encode("utf-8")
+    return html_content
+
+
+# Song page of a connected track: /<Artist>/<Song-Title>/, as scraper.py builds it
+def _song_url(artist_link, track_name):
+    artist_path = artist_link.get("href", "").rstrip("/")
+    return f"{BASE_URL}{artist_path}/{quote(track_name.strip().replace(' ', '-'))}/"
+
+
+# Extract the rows of one "Song Connections" table
+def _extract_rows(rows):
+    songs = []
+    for row in rows:
+        meta = META_CELLS(row)
+        artist_links = LINKS(meta[0]) if meta else []
+        artists = [TEXT(a) for a in artist_links]
+        href = FIRST_HREF(row)
+        track_name = TRACK_NAME(row) or "Unknown Track"
+
+        songs.append({
+            "track_name": track_name,
+            "artists": artists or ["Unknown Artist"],
+            "release_year": TEXT(meta[1]) if len(meta) > 1 else "Unknown Year",
+            "additional_info": TEXT(meta[2]) if len(meta) > 2 else "",
+            "url": BASE_URL + href if href else "",
+            "song_url": _song_url(artist_links[0], track_name) if artist_links else "",
+        })
+    return songs
+
+
+# Parse the song page to extract title, samples and sampled_by
+def parse_song_data(html_content, url=""):
+    doc = etree.fromstring(_as_bytes(html_content), HTML_PARSER)
+    data = {
+        "url": url,
+        "samples": [],
+        "sampled_by": [],
+    }
+
+    title = TITLE(doc)
+    artist = ARTIST(doc)
+    data["search_query"] = title or "Unknown Title"
+    data["original_song"] = f"{artist} - {title}" if artist else data["search_query"]
+
+    for header in SECTION_HEADERS(doc):
+        heading = TEXT(header).lower()
+        field = next((f for prefix, f in SECTIONS.items() if heading.startswith(prefix)), None)
+        if field is not None:
+            data[field] = _extract_rows(SECTION_ROWS(header))
+
+    return data
@@ -0,0 +1,189 @@
+import asyncio
+import os
+
+import pytest
+from playwright.async_api import Error, TimeoutError
+
+from browser_pool import PLAYWRIGHT_TIMEOUT_MARGIN, BrowserPool, TargetClosedError
+
+
+class FakePage:
+    def __init__(self, browser):
+        self.browser = browser
+
+    async def goto(self, url, wait_until=None):
+        error = self.browser.errors.pop(0) if self.browser.errors else None
+        if error == "crash":
+            self.browser.connected = False
+            raise Error("Target crashed")
+        if error is not None:
+            raise error
+
+    async def wait_for_selector(self, selector):
+        pass
+
+    async def content(self):
+        return "<div class='divided-layout'></div>"
+
+    async def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.timeout = None
+        self.close_error = None
+
+    def set_default_timeout(self, timeout):
+        self.timeout = timeout
+
+    async def new_page(self):
+        return FakePage(self.browser)
+
+    async def route(self, pattern, handler):
+        pass
+
+    async def close(self):
+        if self.close_error:
+            raise self.close_error
+
+
+# CDP session reporting this test process as the browser's only process
+class FakeSession:
+    def __init__(self, browser):
+        self.browser = browser
+
+    async def send(self, method):
+        self.browser.probes += 1
+        if self.browser.probe_error:
+            raise self.browser.probe_error
+        return {"processInfo": [{"id": os.getpid(), "type": "browser"}]}
+
+    async def detach(self):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self, errors, probe_error=None):
+        self.errors = errors
+        self.connected = True
+        self.closed = False
+        self.probes = 0
+        self.probe_error = probe_error
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **options):
+        return FakeContext(self)
+
+    async def new_browser_cdp_session(self):
+        return FakeSession(self)
+
+    async def close(self):
+        self.closed = True
+
+
+# Stands in for the playwright driver; every launch shares one list of errors to raise
+class FakePlaywright:
+    def __init__(self, errors, probe_error=None):
+        self.chromium = self
+        self.errors = errors
+        self.probe_error = probe_error
+
+    async def launch(self, headless=True):
+        return FakeBrowser(self.errors, self.probe_error)
+
+
+class FakePool(BrowserPool):
+    def __init__(self, errors, probe_error=None, **options):
+        super().__init__(size=1, **{"max_rss_mb": 0, **options})
+        self.errors = errors
+        self.probe_error = probe_error
+        self.launched = []
+
+    async def start(self):
+        self.playwright = FakePlaywright(self.errors, self.probe_error)
+        self.slots = asyncio.Queue()
+        self.slots.put_nowait(await self._launch())
+
+    async def _launch(self):
+        slot = await super()._launch()
+        self.launched.append(slot.context)
+        return slot
+
+
+def render_all(pool, count):
+    async def run():
+        await pool.start()
+        outcomes = []
+        for _ in range(count):
+            try:
+                outcomes.append(await pool.render("https://www.whosampled.com/x/y/"))
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("error", [TimeoutError("Timeout 30000ms exceeded"),
+                                   Error("net::ERR_NAME_NOT_RESOLVED at https://www.whosampled.com/x/y/")])
+def test_page_errors_keep_the_browser(error):
+    pool = FakePool([error])
+    outcomes = render_all(pool, 2)
+    assert isinstance(outcomes[0], Error) and isinstance(outcomes[1], str)
+    assert len(pool.launched) == 1 and pool.recycled == 0
+
+
+def test_crashed_browser_is_replaced():
+    pool = FakePool(["crash"])
+    outcomes = render_all(pool, 2)
+    assert isinstance(outcomes[0], Error) and isinstance(outcomes[1], str)
+    assert len(pool.launched) == 2 and pool.recycled == 1
+
+
+@pytest.mark.skipif(TargetClosedError == (), reason="playwright does not expose TargetClosedError")
+def test_target_closed_replaces_the_browser():
+    pool = FakePool([TargetClosedError()])
+    render_all(pool, 2)
+    assert pool.recycled == 1
+
+
+def test_playwright_timeouts_outlast_the_pool_timeout():
+    pool = FakePool([], page_timeout=12.0)
+    render_all(pool, 1)
+    assert pool.launched[0].timeout == (12.0 + PLAYWRIGHT_TIMEOUT_MARGIN) * 1000
+
+
+def test_browsers_over_the_rss_limit_are_replaced():
+    # This process is the "browser", and it uses more than 1 MB
+    pool = FakePool([], max_rss_mb=1, rss_check_every=2)
+    outcomes = render_all(pool, 5)
+    assert all(isinstance(outcome, str) for outcome in outcomes)
+    assert pool.recycled == 2
+    assert [context.browser.probes for context in pool.launched] == [1, 1, 0]
+
+
+def test_failed_rss_probes_turn_rss_checks_off(capsys):
+    pool = FakePool([], probe_error=Error("'SystemInfo.getProcessInfo' wasn't found"),
+                    max_rss_mb=1, rss_check_every=1)
+    outcomes = render_all(pool, 3)
+    assert all(isinstance(outcome, str) for outcome in outcomes)
+    assert pool.recycled == 0 and pool.max_rss is None
+    assert pool.launched[0].browser.probes == 1
+    assert "no longer checking RSS" in capsys.readouterr().err
+
+
+def test_shutdown_closes_the_browser_when_the_context_fails():
+    pool = FakePool([], pages_per_browser=1)
+
+    async def run():
+        await pool.start()
+        await pool.render("https://www.whosampled.com/x/y/")
+        pool.launched[0].close_error = Error("Target closed")
+        await pool.render("https://www.whosampled.com/x/y/")
+
+    asyncio.run(run())
+    assert pool.recycled == 1 and pool.launched[0].browser.closed
@@ -0,0 +1,99 @@
+import asyncio
+import os
+
+import httpx
+
+from crawler import Crawler
+from parse_pool import ParsePool
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "song_page.html")
+
+
+def site(fail_first=None):
+    with open(FIXTURE, "rb") as f:
+        body = f.read()
+    requests = []
+
+    def handler(request):
+        requests.append(str(request.url))
+        if fail_first and requests.count(str(request.url)) <= fail_first:
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        return httpx.Response(200, content=body)
+
+    return httpx.MockTransport(handler), requests
+
+
+def crawler(transport, **options):
+    options = {"rate": None, "render": False, "parse_workers": 0, "backoff": 0, **options}
+    return Crawler(transport=transport, **options)
+
+
+def test_crawl_parses_every_page():
+    transport, requests = site()
+    urls = [f"https://www.whosampled.com/A/{n}/" for n in range(20)]
+
+    async def run():
+        async with crawler(transport, concurrency=4) as c:
+            return [result async for result in c.crawl(urls)]
+
+    results = asyncio.run(run())
+    assert sorted(r.url for r in results) == sorted(urls)
+    assert all(r.ok and r.data["original_song"] for r in results)
+
+
+def test_retryable_statuses_are_retried():
+    transport, requests = site(fail_first=2)
+
+    async def run():
+        async with crawler(transport, retries=3) as c:
+            return await c.crawl_one("https://www.whosampled.com/A/B/")
+
+    assert asyncio.run(run()).ok
+    assert len(requests) == 3
+
+
+def test_long_retry_after_gives_up_instead_of_waiting():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(503, headers={"Retry-After": "3600"})
+
+    async def run():
+        async with crawler(httpx.MockTransport(handler), retries=3, max_retry_after=60.0) as c:
+            return await asyncio.wait_for(c.crawl_one("https://www.whosampled.com/A/B/"), 5.0)
+
+    result = asyncio.run(run())
+    assert not result.ok and result.status == 503
+    assert len(requests) == 1
+
+
+def test_slow_consumers_hold_the_fetchers_back():
+    transport, requests = site()
+    urls = [f"https://www.whosampled.com/A/{n}/" for n in range(200)]
+
+    async def run():
+        async with crawler(transport, concurrency=4) as c:
+            results = c.crawl(urls)
+            await results.__anext__()
+            await asyncio.sleep(0.2)
+            fetched = len(requests)
+            await results.aclose()
+            return fetched
+
+    # Four waiting results, four workers blocked putting theirs, plus the one consumed
+    assert asyncio.run(run()) <= 9
+
+
+def test_parse_pool_bounds_pending_pages():
+    pool = ParsePool(workers=2)
+    assert pool.max_pending == 4
+
+    async def run():
+        with open(FIXTURE, "rb") as f:
+            body = f.read()
+        with pool:
+            return await asyncio.gather(*(pool.parse(body, str(n)) for n in range(8)))
+
+    results = asyncio.run(run())
+    assert [r["url"] for r in results] == [str(n) for n in range(8)]
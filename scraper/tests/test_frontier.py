@@ -0,0 +1,173 @@
+import asyncio
+import os
+import sqlite3
+import time
+
+import httpx
+import mongomock
+import pytest
+
+from frontier import DONE, FAILED, IN_FLIGHT, QUEUED, Frontier, canonical_url, crawl_shard, url_key
+from mongo_sink import SongSink
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "song_page.html")
+
+
+def state(path, url):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT state FROM urls WHERE key = ?", (url_key(canonical_url(url)),)).fetchone()[0]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "frontier.sqlite3")
+
+
+def test_canonical_url_dedupes_variants(path):
+    assert canonical_url("HTTPS://WWW.Whosampled.com:443/A/B?utm_source=x#top") == "https://www.whosampled.com/A/B/"
+    with Frontier(path) as frontier:
+        assert frontier.add("https://www.whosampled.com/A/B/")
+        assert not frontier.add("https://www.whosampled.com/A/B?utm_medium=y")
+
+
+def test_settlements_are_only_written_at_checkpoints(path):
+    url = "https://www.whosampled.com/A/B/"
+    with Frontier(path) as frontier:
+        frontier.add(url)
+        frontier.checkpoint()
+        assert frontier.claim(10) == [(canonical_url(url), 0)]
+        frontier.done(url)
+        assert state(path, url) == IN_FLIGHT
+        frontier.checkpoint()
+        assert state(path, url) == DONE
+
+
+def test_shards_do_not_block_each_other(path):
+    with Frontier(path, shards=2) as seeder:
+        urls = [f"https://www.whosampled.com/A/{n}/" for n in range(20)]
+        for url in urls:
+            seeder.add(url)
+    shard0 = Frontier(path, shard=0, recover=True)
+    shard1 = Frontier(path, shard=1, recover=True)
+    shard1.conn.execute("PRAGMA busy_timeout = 0")
+    try:
+        claimed0 = shard0.claim(20)
+        claimed1 = shard1.claim(20)
+        assert claimed0 and claimed1
+        shard0.done(claimed0[0][0])
+        shard1.done(claimed1[0][0])
+        # shard 0 has an unwritten settlement; shard 1 can still commit at once
+        shard1.checkpoint()
+        shard1.add("https://www.whosampled.com/B/new/")
+        shard1.checkpoint()
+    finally:
+        shard0.close()
+        shard1.close()
+    assert state(path, claimed0[0][0]) == DONE
+
+
+def test_recover_requeues_in_flight_urls(path):
+    url = "https://www.whosampled.com/A/B/"
+    frontier = Frontier(path)
+    frontier.add(url)
+    frontier.checkpoint()
+    frontier.claim(1)
+    frontier.done(url)
+    frontier.conn.close()  # crash before the next checkpoint
+    assert state(path, url) == IN_FLIGHT
+
+    with Frontier(path) as frontier:
+        assert frontier.claim(1) == []
+    with Frontier(path, recover=True) as frontier:
+        assert frontier.claim(1) == [(canonical_url(url), 0)]
+
+
+def test_expired_leases_are_claimed_again(path):
+    url = "https://www.whosampled.com/A/B/"
+    with Frontier(path, lease_seconds=0.05) as frontier:
+        frontier.add(url)
+        frontier.checkpoint()
+        assert frontier.claim(1)
+    with Frontier(path, lease_seconds=0.05) as frontier:
+        time.sleep(0.1)
+        assert frontier.claim(1) == [(canonical_url(url), 0)]
+
+
+def test_failures_are_retried_up_to_max_attempts(path):
+    url = "https://www.whosampled.com/A/B/"
+    with Frontier(path, max_attempts=2) as frontier:
+        frontier.add(url)
+        frontier.checkpoint()
+        frontier.claim(1)
+        frontier.fail(url, "HTTP 500")
+        frontier.checkpoint()
+        assert state(path, url) == QUEUED
+        assert frontier.claim(1)
+        frontier.fail(url, "HTTP 500")
+        frontier.checkpoint()
+        assert state(path, url) == FAILED
+        assert frontier.claim(1) == []
+
+
+def test_crawl_shard_follows_links_and_records_results(path):
+    with open(FIXTURE, "rb") as f:
+        body = f.read()
+    seed = "https://www.whosampled.com/Seed/Song/"
+    requested = []
+
+    def handler(request):
+        requested.append(str(request.url))
+        if len(requested) == 3:
+            return httpx.Response(404)
+        return httpx.Response(200, content=body)
+
+    collection = mongomock.MongoClient().db.Song
+    with Frontier(path) as frontier:
+        frontier.add(seed)
+        frontier.checkpoint()
+    with Frontier(path, recover=True) as frontier, SongSink(collection) as sink:
+        crawled = asyncio.run(crawl_shard(frontier, sink, max_depth=1, batch_size=4, idle_timeout=0.2,
+                                          transport=httpx.MockTransport(handler), concurrency=4,
+                                          rate=None, retries=0, render=False, parse_workers=0))
+        stats = frontier.stats()
+
+    assert requested[0] == seed and len(requested) > 3
+    # The 404 is queued again and its second attempt succeeds
+    assert crawled == len(requested) - 1
+    assert stats == {"queued": 0, "in flight": 0, "done": crawled, "failed": 0}
+    assert collection.count_documents({}) >= 1
+
+
+def test_shards_wait_for_work_found_by_other_shards(path):
+    with open(FIXTURE, "rb") as f:
+        body = f.read()
+    # Hashes to shard 1; four of the fixture's links hash to shard 0
+    seed = "https://www.whosampled.com/Seed/Song/"
+
+    async def handler(request):
+        if str(request.url) == seed:
+            await asyncio.sleep(1.5)
+        return httpx.Response(200, content=body)
+
+    with Frontier(path, shards=2) as frontier:
+        frontier.add(seed)
+        frontier.checkpoint()
+    collection = mongomock.MongoClient().db.Song
+    shard0 = Frontier(path, shard=0, recover=True)
+    shard1 = Frontier(path, shard=1, recover=True)
+
+    async def run():
+        options = dict(max_depth=1, batch_size=4, idle_timeout=0.1, transport=httpx.MockTransport(handler),
+                       concurrency=2, rate=None, retries=0, render=False, parse_workers=0)
+        with SongSink(collection) as sink0, SongSink(collection) as sink1:
+            return await asyncio.gather(crawl_shard(shard0, sink0, **options),
+                                        crawl_shard(shard1, sink1, **options))
+
+    try:
+        crawled = asyncio.run(run())
+        stats = shard0.stats()
+    finally:
+        shard0.close()
+        shard1.close()
+    assert crawled == [4, 2]
+    assert stats == {"queued": 0, "in flight": 0, "done": 6, "failed": 0}
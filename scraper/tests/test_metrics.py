@@ -0,0 +1,134 @@
+import asyncio
+import os
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import Crawler
+from metrics import STAGE_SECONDS, Registry, request_tracer, start_metrics_server
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "song_page.html")
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def test_counters_are_exposed_per_label(registry):
+    responses = registry.counter("responses_total", "Responses.", ["code"])
+    responses.labels("200").inc(3)
+    responses.labels("404").inc()
+    assert registry.expose().splitlines() == [
+        "# HELP responses_total Responses.",
+        "# TYPE responses_total counter",
+        'responses_total{code="200"} 3',
+        'responses_total{code="404"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    latency = registry.histogram("latency_seconds", "Latency.", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.labels("fetch").observe(value)
+    assert registry.expose().splitlines()[2:] == [
+        'latency_seconds_bucket{stage="fetch",le="0.1"} 2',
+        'latency_seconds_bucket{stage="fetch",le="1"} 3',
+        'latency_seconds_bucket{stage="fetch",le="+Inf"} 4',
+        'latency_seconds_sum{stage="fetch"} 2.65',
+        'latency_seconds_count{stage="fetch"} 4',
+    ]
+
+
+def test_quantiles_interpolate_within_buckets(registry):
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(1.0, 2.0, 4.0))
+    child = latency.labels()
+    assert child.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 3.0):
+        latency.observe(value)
+    assert child.quantile(0.25) == 1.0
+    assert child.quantile(0.5) == 1.5
+    assert child.quantile(1.0) == 4.0
+    latency.observe(10.0)
+    # Past the last bound there is nothing to interpolate towards
+    assert child.quantile(1.0) == 4.0
+
+
+def observations(stage):
+    child = STAGE_SECONDS.children.get((stage,))
+    return child.count if child else 0
+
+
+def test_tracer_maps_trace_events_to_stages():
+    async def run():
+        trace = request_tracer()
+        for event in ("connection.connect_tcp.started", "connection.connect_tcp.complete",
+                      "http11.send_request_headers.started", "http11.send_request_headers.complete",
+                      "http11.receive_response_headers.started", "http11.receive_response_headers.complete",
+                      "http11.receive_response_body.started", "http11.receive_response_body.failed",
+                      "http11.response_closed.started"):
+            await trace(event, {})
+
+    before = {stage: observations(stage) for stage in ("connect", "tls", "ttfb", "download")}
+    asyncio.run(run())
+    after = {stage: observations(stage) for stage in before}
+    assert {stage: after[stage] - before[stage] for stage in before} == {
+        "connect": 1, "tls": 0, "ttfb": 1, "download": 1}
+
+
+def test_metrics_server_serves_the_registry(registry):
+    registry.counter("pages_total", "Pages.").inc(2)
+    server = start_metrics_server(0, registry=registry)
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "pages_total 2" in response.read().decode("utf-8").splitlines()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{base}/other")
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# httpx.MockTransport skips the connection layer and fires no trace events,
+# so the crawl runs against a real local server
+def test_crawl_records_network_and_parse_stages():
+    with open(FIXTURE, "rb") as f:
+        body = f.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_address[1]}/A/{n}/" for n in range(3)]
+
+    async def run():
+        async with Crawler(rate=None, render=False, parse_workers=0) as crawler:
+            return [await crawler.crawl_one(url) for url in urls]
+
+    stages = ("connect", "ttfb", "download", "parse")
+    before = {stage: observations(stage) for stage in stages}
+    try:
+        results = asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert all(result.ok for result in results)
+    recorded = {stage: observations(stage) - before[stage] for stage in stages}
+    # One keep-alive connection serves all three pages
+    assert recorded == {"connect": 1, "ttfb": 3, "download": 3, "parse": 3}
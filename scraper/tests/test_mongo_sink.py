@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import mongomock
+import pytest
+
+from mongo_sink import SongSink
+
+
+def song(name, samples=(), sampled_by=()):
+    def edge(track):
+        return {"track_name": track, "artists": ["Someone"], "release_year": "1970",
+                "additional_info": "", "url": f"https://www.whosampled.com/sample/{track}/",
+                "song_url": f"https://www.whosampled.com/Someone/{track}/"}
+
+    return {"original_song": name, "search_query": name.split(" - ")[-1], "url": "",
+            "samples": [edge(t) for t in samples], "sampled_by": [edge(t) for t in sampled_by]}
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class FailingCollection:
+    def bulk_write(self, ops, ordered=True):
+        raise RuntimeError("write failed")
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.Song
+
+
+def test_recrawls_do_not_duplicate_edges(collection):
+    with SongSink(collection) as sink:
+        sink.add(song("A - One", samples=["x", "y"]))
+        sink.add(song("A - One", samples=["y"], sampled_by=["z"]))
+        sink.flush()
+        sink.add(song("A - One", samples=["x", "y"], sampled_by=["z"]))
+        sink.flush()
+
+    docs = list(collection.find())
+    assert len(docs) == 1
+    assert [e["track_name"] for e in docs[0]["samples"]] == ["x", "y"]
+    assert [e["track_name"] for e in docs[0]["sampled_by"]] == ["z"]
+    assert "song_url" not in docs[0]["samples"][0]
+
+
+def test_songs_are_keyed_by_normalized_title(collection):
+    with SongSink(collection) as sink:
+        sink.add(song("The Winstons - Amen, Brother"))
+    doc = collection.find_one({"keys": "amen brother"})
+    assert doc["original_song"] == "The Winstons - Amen, Brother"
+    assert doc["keys"] == ["amen brother", "the winstons amen brother"]
+
+
+def test_flushes_when_batch_is_full(collection):
+    with SongSink(collection, batch_size=3, flush_interval=60) as sink:
+        for n in range(3):
+            sink.add(song(f"A - {n}"))
+        assert wait_for(lambda: collection.count_documents({}) == 3)
+        assert sink.flushes == 1
+
+
+def test_flushes_after_interval(collection):
+    with SongSink(collection, batch_size=100, flush_interval=0.1) as sink:
+        sink.add(song("A - One"))
+        assert wait_for(lambda: collection.count_documents({}) == 1)
+
+
+def test_close_writes_everything(collection):
+    with SongSink(collection, batch_size=100, flush_interval=60) as sink:
+        for n in range(10):
+            sink.add(song(f"A - {n}"))
+    assert collection.count_documents({}) == 10
+    assert sink.stats()["docs"] == 10
+
+
+def test_write_errors_reach_the_caller():
+    sink = SongSink(FailingCollection(), batch_size=1)
+    sink.start()
+    sink.add(song("A - One"))
+    with pytest.raises(RuntimeError):
+        sink.flush()
+    with pytest.raises(RuntimeError):
+        sink.add(song("A - Two"))
+    with pytest.raises(RuntimeError):
+        sink.close()
+
+
+def test_on_flush_sees_written_songs(collection):
+    flushed = []
+    with SongSink(collection, on_flush=lambda songs: flushed.extend(s["original_song"] for s in songs)) as sink:
+        sink.add(song("A - One"))
+        sink.flush()
+        assert flushed == ["A - One"]
+
+
+def test_async_add_does_not_block_the_event_loop(collection):
+    async def run(sink):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        for n in range(20):
+            await sink.add_async(song(f"A - {n}"))
+        await sink.flush_async()
+        task.cancel()
+        return ticks
+
+    class SlowCollection:
+        def bulk_write(self, ops, ordered=True):
+            time.sleep(0.1)
+            return collection.bulk_write(ops, ordered=ordered)
+
+    with SongSink(SlowCollection(), batch_size=5, max_pending=5) as sink:
+        ticks = asyncio.run(run(sink))
+    assert collection.count_documents({}) == 20
+    # Four slow writes happened while the loop kept running
+    assert ticks >= 10
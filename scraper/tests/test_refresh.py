@@ -0,0 +1,84 @@
+import asyncio
+import os
+
+import httpx
+import mongomock
+import pytest
+
+from crawl_index import CrawlIndex
+from refresh import refresh
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "song_page.html")
+URL = "https://www.whosampled.com/Artist/Song/"
+
+
+class FailingCollection:
+    def bulk_write(self, ops, ordered=True):
+        raise RuntimeError("write failed")
+
+
+class Site:
+    def __init__(self):
+        with open(FIXTURE, "rb") as f:
+            self.body = f.read()
+        self.etag = '"v1"'
+        self.requests = []
+
+    def handler(self, request):
+        self.requests.append(request)
+        if request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, content=self.body, headers={"ETag": self.etag})
+
+
+def run(site, index, collection, **options):
+    return asyncio.run(refresh([URL], index, collection, transport=httpx.MockTransport(site.handler),
+                               rate=None, retries=0, render=False, parse_workers=0, **options))
+
+
+@pytest.fixture
+def index(tmp_path):
+    with CrawlIndex(str(tmp_path / "index.sqlite3")) as index:
+        yield index
+
+
+def test_unchanged_pages_are_revalidated_not_rewritten(index):
+    site, collection = Site(), mongomock.MongoClient().db.Song
+    assert run(site, index, collection)["rewritten"] == 1
+    assert collection.count_documents({}) == 1
+    assert index.get(URL)["etag"] == '"v1"'
+
+    summary = run(site, index, collection)
+    assert summary["not_modified"] == 1 and summary["rewritten"] == 0
+    assert site.requests[-1].headers["If-None-Match"] == '"v1"'
+
+
+def test_changed_etag_with_same_body_is_not_reparsed(index):
+    site, collection = Site(), mongomock.MongoClient().db.Song
+    run(site, index, collection)
+    site.etag = '"v2"'
+    summary = run(site, index, collection)
+    assert summary["unchanged"] == 1 and summary["reparsed"] == 0
+    assert index.get(URL)["etag"] == '"v2"'
+
+
+def test_index_is_not_written_when_mongo_write_fails(index):
+    site = Site()
+    with pytest.raises(RuntimeError):
+        run(site, index, FailingCollection())
+    assert index.get(URL) is None
+
+    # The next run treats the page as new and writes it
+    collection = mongomock.MongoClient().db.Song
+    summary = run(site, index, collection)
+    assert summary["rewritten"] == 1
+    assert collection.count_documents({}) == 1
+    assert "If-None-Match" not in site.requests[-1].headers
+
+
+def test_full_rewrites_everything(index):
+    site, collection = Site(), mongomock.MongoClient().db.Song
+    run(site, index, collection)
+    summary = run(site, index, collection, full=True)
+    assert summary["reparsed"] == 1 and summary["rewritten"] == 1
+    assert "If-None-Match" not in site.requests[-1].headers
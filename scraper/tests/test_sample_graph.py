@@ -0,0 +1,55 @@
+import mongomock
+
+from sample_graph import SAMPLED_BY, SAMPLES, SampleGraph, write_tree_cache
+
+
+def edge(name):
+    artist, track = name.split(" - ")
+    return {"track_name": track, "artists": [artist]}
+
+
+def graph_of(songs):
+    graph = SampleGraph()
+    for name, sampled_by in songs.items():
+        graph.add_song({"original_song": name, "sampled_by": [edge(s) for s in sampled_by]})
+    graph.freeze()
+    return graph
+
+
+def test_trees_mark_repeats_and_cycles():
+    graph = graph_of({"A - One": ["B - Two", "C - Three"], "B - Two": ["C - Three", "A - One"]})
+    root, emitted = graph.tree(graph.ids["a one"], SAMPLED_BY, depth=3)
+    assert [c["name"] for c in root["children"]] == ["B - Two", "C - Three"]
+    two = root["children"][0]
+    assert [(c["name"], c.get("repeat", False)) for c in two["children"]] == [("A - One", True),
+                                                                             ("C - Three", True)]
+    assert emitted == 5
+
+    samples, _ = graph.tree(graph.ids["c three"], SAMPLES, depth=1)
+    assert sorted(c["name"] for c in samples["children"]) == ["A - One", "B - Two"]
+
+
+def test_max_nodes_truncates():
+    graph = graph_of({"A - One": [f"B - {n}" for n in range(10)]})
+    root, emitted = graph.tree(graph.ids["a one"], SAMPLED_BY, depth=1, max_nodes=4)
+    assert emitted == 4 and root["truncated"]
+
+
+def test_rebuild_removes_documents_from_earlier_builds():
+    collection = mongomock.MongoClient().db.tree_cache
+    graph = graph_of({"A - One": ["B - Two"]})
+    assert write_tree_cache(graph, collection) == (1, 0)
+
+    # A key produced by an older normalize_title, no longer generated
+    collection.insert_one({"_id": "a  one (old)", "keys": ["one"], "weight": 99, "build": 0})
+    written, deleted = write_tree_cache(graph, collection)
+    assert (written, deleted) == (1, 1)
+    assert [doc["_id"] for doc in collection.find({"keys": "one"})] == ["a one"]
+
+
+def test_cache_documents_list_key_prefixes():
+    graph = graph_of({"The Winstons - Amen, Brother": []})
+    doc = graph.cache_document(0)
+    assert doc["keys"] == ["amen brother", "the winstons amen brother"]
+    assert {"a", "amen", "amen broth", "the winsto"} <= set(doc["prefixes"])
+    assert max(len(p) for p in doc["prefixes"]) == 10
@@ -0,0 +1,64 @@
+from search_index import SearchIndex
+
+
+def test_longer_prefixes_rank_the_whole_range_by_weight():
+    names = [f"Artist {n} - Amen track {n}" for n in range(2000)]
+    weights = [0] * 1999 + [500]
+    index = SearchIndex(names, weights)
+    for query in ("a", "amen", "amen t", "amen track", "artist 1"):
+        assert index.search(query)[0][1] == 1999, query
+    # An exact title still beats a heavier prefix match
+    assert [node_id for _, node_id in index.search("amen track 1")[:2]] == [1, 1999]
+
+
+def test_exact_title_ties_go_to_the_best_connected():
+    names = [f"Artist {n} - Amen Brother" for n in range(500)]
+    weights = [n % 7 for n in range(500)]
+    weights[321] = 100
+    index = SearchIndex(names, weights)
+    assert index.search("amen brother")[0][1] == 321
+
+
+def test_tiers():
+    names = ["The Winstons - Amen, Brother", "Amen - Amen Corner", "X - Brother Amen", "Y - Brotherhood"]
+    index = SearchIndex(names, [1, 5, 50, 100])
+    # Exact title, then title prefix, then word suffix match
+    assert [n for n, _ in index.search("brother", fuzzy=False)] == [
+        "Y - Brotherhood", "X - Brother Amen", "The Winstons - Amen, Brother"]
+    assert index.search("amen brother")[0][0] == "The Winstons - Amen, Brother"
+    assert index.search("winstons amen")[0][0] == "The Winstons - Amen, Brother"
+
+
+def test_fuzzy_fallback():
+    index = SearchIndex(["The Winstons - Amen, Brother", "Lyn Collins - Think"], [1, 1])
+    assert index.search("the winstons amen brohter")[0][0] == "The Winstons - Amen, Brother"
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "index.pickle")
+    index = SearchIndex([f"A - Song {n}" for n in range(50)], list(range(50)))
+    index.save(path)
+    loaded = SearchIndex.load(path)
+    assert loaded.search("song") == index.search("song")
+    assert loaded.search("song")[0][1] == 49
+
+
+def test_tied_weights_do_not_scan_the_range(monkeypatch):
+    import heapq
+
+    import search_index
+
+    index = SearchIndex([f"Artist {n} - Song {n}" for n in range(20000)], [1] * 20000)
+    pops = []
+    pop = heapq.heappop
+
+    def heappop(heap):
+        pops.append(1)
+        return pop(heap)
+
+    monkeypatch.setattr(search_index.heapq, "heappop", heappop)
+    for query in ("s", "song", "a"):
+        del pops[:]
+        assert len(index.search(query)) == 10
+        # Two ranges of 20 candidates, each a root-to-leaf walk
+        assert len(pops) < 2000, query
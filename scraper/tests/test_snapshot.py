@@ -0,0 +1,48 @@
+import pytest
+
+from sample_graph import SAMPLED_BY, SAMPLES, SampleGraph
+from snapshot import Snapshot, write_snapshot
+
+
+def edge(name):
+    artist, track = name.split(" - ")
+    return {"track_name": track, "artists": [artist]}
+
+
+@pytest.fixture
+def graph():
+    graph = SampleGraph()
+    songs = {"A - One": ["B - Two", "C - Three"], "B - Two": ["C - Three", "A - One"], "D - One": []}
+    for name, sampled_by in songs.items():
+        graph.add_song({"original_song": name, "sampled_by": [edge(s) for s in sampled_by]})
+    graph.freeze()
+    return graph
+
+
+@pytest.fixture
+def path(graph, tmp_path):
+    path = str(tmp_path / "graph.snapshot")
+    write_snapshot(graph, path)
+    return path
+
+
+def test_trees_match_the_graph(graph, path):
+    with Snapshot(path) as snapshot:
+        assert snapshot.node_count == len(graph.names)
+        for node_id in range(len(graph.names)):
+            for direction in (SAMPLED_BY, SAMPLES):
+                assert snapshot.tree(node_id, direction) == graph.tree(node_id, direction)
+
+
+def test_find_prefers_the_best_connected(graph, path):
+    with Snapshot(path) as snapshot:
+        assert snapshot.names[snapshot.find("one")] == "A - One"
+        assert snapshot.names[snapshot.find("D - One")] == "D - One"
+        assert snapshot.find("four") is None
+
+
+def test_neighbours_outlive_the_snapshot(graph, path):
+    with Snapshot(path) as snapshot:
+        node_id = snapshot.find("A - One")
+        neighbours = snapshot.neighbours(node_id)
+    assert list(neighbours) == list(graph.neighbours(node_id))
@@ -0,0 +1,23 @@
+import json
+import os
+
+import pytest
+
+from titles import normalize_title, title_keys
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures",
+                       "normalized_titles.json")
+
+with open(FIXTURE, encoding="utf-8") as f:
+    CASES = json.load(f)
+
+
+# backend/test/titles.test.js checks the same cases against normalizeTitle
+@pytest.mark.parametrize("title, key", CASES)
+def test_normalize_title(title, key):
+    assert normalize_title(title) == key
+
+
+def test_title_keys():
+    assert title_keys("The Winstons - Amen, Brother") == ["amen brother", "the winstons amen brother"]
+    assert title_keys("Amen Brother") == ["amen brother"]
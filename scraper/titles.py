@@ -0,0 +1,44 @@
+import re
+import unicodedata
+
+# "feat. X", "(ft. X)", "[featuring X]" up to the closing bracket or the " - " separator
+FEATURE_RE = re.compile(r"[(\[]?\b(?:feat|ft|featuring)\b\.?(?:(?! - )[^)\]])*[)\]]?")
+# "(Remastered 2009)", "[2011 Remaster]", " - 2011 Remastered Version"
+REMASTER_RE = re.compile(r"[(\[][^)\]]*\bremaster(?:ed)?\b[^)\]]*[)\]]"
+                         r"| - (?:\d{4} )?(?:digital )?remaster(?:ed)?\b.*$")
+APOSTROPHE_RE = re.compile(r"['’`]")
+PUNCTUATION_RE = re.compile(r"[^\w]+")
+
+
+# Decompose and drop every mark (category M*), not only those with a combining
+# class: spacing vowel signs would otherwise split Indic words into letters
+def fold_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.category(c).startswith("M"))
+
+
+# Normalize a song title for lookups: accents folded, case-folded, featured
+# artists and remaster suffixes dropped, punctuation collapsed to single spaces.
+# backend/titles.js mirrors this for tree_cache keys; both are checked against
+# fixtures/normalized_titles.json.
+def normalize_title(title):
+    text = fold_accents(title).casefold()
+    text = REMASTER_RE.sub(" ", text)
+    text = FEATURE_RE.sub(" ", text)
+    text = APOSTROPHE_RE.sub("", text.replace("&", " and "))
+    return " ".join(PUNCTUATION_RE.sub(" ", text).replace("_", " ").split())
+
+
+# "Artist - Title" name used for songs that only appear as samples/sampled_by entries
+def song_name(track_name, artists):
+    return f"{artists[0]} - {track_name}" if artists else track_name
+
+
+# The title part of an "Artist - Title" name
+def title_part(name):
+    return name.split(" - ", 1)[1] if " - " in name else name
+
+
+# Lookup keys for an "Artist - Title" name: its normalized full name and title,
+# as stored in the `keys` field of Song and tree_cache documents
+def title_keys(name):
+    return sorted({normalize_title(name), normalize_title(title_part(name))})